@@ -1,7 +1,8 @@
-from typing import Any, cast
+from typing import Any
 from discord.ext import commands
 
 from utils.bots.bot import CustomBot
+from utils.ratelimit import CooldownMapping
 
 
 class Cooldown(commands.Cog):
@@ -10,20 +11,19 @@ class Cooldown(commands.Cog):
     def __init__(self, bot: CustomBot) -> None:
         self.bot = bot
 
-        self.cooldown: commands.CooldownMapping[Any] = (
-            commands.CooldownMapping.from_cooldown(10, 6, commands.BucketType.user)
+        self.cooldown = CooldownMapping(
+            bot.cooldowns, "global", 10, 6, commands.BucketType.user
         )
 
     async def bot_check_once(
         self, ctx: commands.Context[Any]
     ) -> bool:  # it is compatible
         # Cooldown
-        bucket = cast(
-            commands.Cooldown, self.cooldown.get_bucket(ctx.message)
-        )  # it should always be there
-        retry_after = bucket.update_rate_limit()
+        retry_after = await self.cooldown.update_rate_limit(ctx.message)
         if isinstance(retry_after, float):
-            raise commands.CommandOnCooldown(bucket, retry_after, self.cooldown.type)  # type: ignore[arg-type]  # it does work
+            raise commands.CommandOnCooldown(
+                self.cooldown.cooldown, retry_after, self.cooldown.type
+            )
         else:
             return True
 
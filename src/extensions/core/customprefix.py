@@ -6,18 +6,26 @@ from discord.ext import commands
 
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
-from utils.database import PCDocument
+from utils.cache import LRUCache
+from utils.changes import DocumentChange
+
+PREFIX_INVALIDATION_TOPIC = "prefix"
 
 
 async def get_prefix(bot: CustomBot, message: discord.Message) -> Iterable[str]:
     prefix: str = bot.config.get("PEPPERCORD_PREFIX", "?")
     if message.guild is not None:
-        if bot["prefix_cache"].get(message.guild.id) is None:
-            guild_document: PCDocument = await bot.get_guild_document(message.guild)
-            prefix = await guild_document.safe_get("prefix", prefix)
-            bot["prefix_cache"][message.guild.id] = prefix
+        cached_prefix = bot["prefix_cache"].get(message.guild.id)
+        if cached_prefix is None:
+            # Only the prefix is needed here, so don't load the whole guild document.
+            guild_document = await bot.ddb["guild"].find_one(
+                {"_id": message.guild.id}, {"prefix": True}
+            )
+            if guild_document is not None:
+                prefix = guild_document.get("prefix", prefix)
+            bot["prefix_cache"].put(message.guild.id, prefix)
         else:
-            prefix = bot["prefix_cache"][message.guild.id]
+            prefix = cached_prefix
     return commands.when_mentioned_or(f"{prefix} ", prefix)(bot, message)
 
 
@@ -27,6 +35,26 @@ class CustomPrefix(commands.Cog):
     def __init__(self, bot: CustomBot) -> None:
         self.bot = bot
 
+    async def cog_load(self) -> None:
+        self.bot.invalidations.subscribe(
+            PREFIX_INVALIDATION_TOPIC, self._drop_cached_prefix
+        )
+        self.bot.subscribe_document_changes(
+            "guild", ("prefix",), self._on_prefix_changed
+        )
+
+    def cog_unload(self) -> None:  # type: ignore[override]  # discord exports wrong
+        self.bot.invalidations.unsubscribe(
+            PREFIX_INVALIDATION_TOPIC, self._drop_cached_prefix
+        )
+        self.bot.unsubscribe_document_changes("guild", self._on_prefix_changed)
+
+    def _drop_cached_prefix(self, guild_id: str) -> None:
+        self.bot["prefix_cache"].pop(int(guild_id))
+
+    async def _on_prefix_changed(self, change: DocumentChange) -> None:
+        self.bot["prefix_cache"].pop(change.document_id)
+
     @commands.command()
     @guild_only()
     @commands.has_permissions(administrator=True)
@@ -37,13 +65,17 @@ class CustomPrefix(commands.Cog):
         prefix: str,
     ) -> None:
         """Changes the bot's prefix. This is only for message commands."""
-        await ctx["guild_document"].update_db({"$set": {"prefix": prefix}})
+        await (await ctx["guild_document"]).update_db({"$set": {"prefix": prefix}})
+        ctx.bot["prefix_cache"].put(ctx.guild.id, prefix)  # type: ignore[union-attr]  # guaranteed at runtime
+        await ctx.bot.invalidations.publish(PREFIX_INVALIDATION_TOPIC, str(ctx.guild.id))  # type: ignore[union-attr]  # guaranteed at runtime
         await ctx.send(f"The prefix is now " f"{prefix}.")
-        ctx.bot["prefix_cache"][ctx.guild.id] = prefix  # type: ignore[union-attr]  # guaranteed at runtime
 
 
 async def setup(bot: CustomBot) -> None:
-    bot["prefix_cache"] = {}
+    bot["prefix_cache"] = LRUCache(
+        int(bot.config.get("PEPPERCORD_PREFIX_CACHE_SIZE", "4096")),
+        ttl=float(bot.config.get("PEPPERCORD_PREFIX_CACHE_TTL", "3600")),
+    )
     bot.command_prefix = get_prefix  # type: ignore[assignment]  # this does work
     await bot.add_cog(CustomPrefix(bot))
 
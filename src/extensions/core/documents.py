@@ -1,13 +1,18 @@
+from functools import partial
 from typing import Any, cast
 
 from discord.ext import commands
 
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
+from utils.database import LazyDocument
 
 
 class DocumentCog(commands.Cog):
-    """Adds document keys to each document."""
+    """
+    Adds document keys to each context.
+    The documents are lazy; they are only loaded once something awaits them.
+    """
 
     def __init__(self, bot: CustomBot):
         self.bot = bot
@@ -15,17 +20,17 @@ class DocumentCog(commands.Cog):
     @commands.Cog.listener("on_context_creation")
     async def append_guild_document(self, ctx: commands.Context[Any]) -> None:
         custom_ctx: CustomContext = cast(CustomContext, ctx)
-        custom_ctx["guild_document"] = (
-            await custom_ctx.bot.get_guild_document(custom_ctx.guild)
-            if custom_ctx.guild is not None
-            else {}
-        )
+        # Outside of a guild, there is no guild document.
+        if custom_ctx.guild is not None:
+            custom_ctx["guild_document"] = LazyDocument(
+                partial(custom_ctx.bot.get_guild_document, custom_ctx.guild)
+            )
 
     @commands.Cog.listener("on_context_creation")
     async def append_user_document(self, ctx: commands.Context[Any]) -> None:
         custom_ctx: CustomContext = cast(CustomContext, ctx)
-        custom_ctx["author_document"] = await custom_ctx.bot.get_user_document(
-            custom_ctx.author
+        custom_ctx["author_document"] = LazyDocument(
+            partial(custom_ctx.bot.get_user_document, custom_ctx.author)
         )
 
 
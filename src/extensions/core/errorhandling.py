@@ -1,7 +1,9 @@
 import asyncio
 import inspect
 from copy import copy
+from functools import partial
 from logging import getLogger
+from time import perf_counter
 from typing import TYPE_CHECKING, Any, Optional, cast, Type
 
 import discord
@@ -22,6 +24,7 @@ from utils.bots.context import CustomContext
 from utils.commands import NotConfigured
 from utils.checks.audio import CantCreateAudioClient
 from utils.checks.blacklisted import EBlacklisted
+from utils.database import LazyDocument
 
 # What is about to happen is nothing short of disgusting.
 try:
@@ -207,25 +210,61 @@ class ErrorLogging(commands.Cog):
     async def append_command_document(self, ctx: commands.Context[Any]) -> None:
         custom_ctx: CustomContext = cast(CustomContext, ctx)
         custom_ctx["command_document"] = (
-            await custom_ctx.bot.get_command_document(custom_ctx.command)
+            LazyDocument(
+                partial(custom_ctx.bot.get_command_document, custom_ctx.command)
+            )
             if custom_ctx.command is not None
             else None
         )
 
+    def _increment_command_stat(self, ctx: CustomContext, stat: str) -> None:
+        assert ctx.command is not None
+        # The stats are only ever written, so there is no need to load the command document for them.
+        # If it has already been loaded, keep its local copy up to date.
+        loaded_document = (
+            ctx["command_document"].peek()
+            if ctx["command_document"] is not None
+            else None
+        )
+        if loaded_document is not None:
+            self.bot.increment_buffer.increment_document(
+                loaded_document, {f"stats.{stat}": 1}
+            )
+        else:
+            self.bot.increment_buffer.increment(
+                self.bot.ddb["commands"],
+                self.bot.command_document_filter(ctx.command),
+                {f"stats.{stat}": 1},
+            )
+
+    def _record_rollup(self, ctx: CustomContext, *, failed: bool) -> None:
+        # Only commands that actually started are rolled up. invoked_at is set by the bot's before-invoke hook,
+        # which doesn't run when a check, cooldown or conversion rejects the invocation.
+        if ctx.command is None or "invoked_at" not in ctx:
+            return
+        self.bot.command_rollups.record(
+            ctx.command.qualified_name,
+            ctx.command.cog_name,
+            failed=failed,
+            latency=perf_counter() - ctx["invoked_at"],
+        )
+
     @commands.Cog.listener("on_command")
     async def log_command_uses(self, ctx: CustomContext) -> None:
         if ctx.command is not None:
-            await ctx["command_document"].update_db({"$inc": {"stats.uses": 1}})
+            self._increment_command_stat(ctx, "uses")
 
     @commands.Cog.listener("on_command_completion")
     async def log_command_completion(self, ctx: CustomContext) -> None:
         if ctx.command is not None:
-            await ctx["command_document"].update_db({"$inc": {"stats.successes": 1}})
+            self._increment_command_stat(ctx, "successes")
+            self._record_rollup(ctx, failed=False)
 
     @commands.Cog.listener("on_command_error")
     async def log_command_error(self, ctx: CustomContext, error: Exception) -> None:
         if ctx.command is not None:
-            await ctx["command_document"].update_db({"$inc": {"stats.errors": 1}})
+            self._increment_command_stat(ctx, "errors")
+            self._record_rollup(ctx, failed=True)
 
 
 class ErrorHandling(commands.Cog):
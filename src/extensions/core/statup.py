@@ -1,10 +1,12 @@
 import logging
+from time import perf_counter
 from typing import cast
 
 from discord import ClientUser
 from discord.ext import commands
 
 from utils.bots.bot import CustomBot
+from utils.indexes import ensure_indexes, warn_on_collection_scans
 
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -14,6 +16,7 @@ class Startup(commands.Cog):
 
     def __init__(self, bot: CustomBot) -> None:
         self.bot: CustomBot = bot
+        self._warmed_up = False
 
     @commands.Cog.listener("on_startup")
     async def list_extensions(self) -> None:
@@ -35,6 +38,19 @@ class Startup(commands.Cog):
             + (f":\n{cogs}" if is_debug_level else ".")
         )
 
+    @commands.Cog.listener("on_startup")
+    async def bootstrap_indexes(self) -> None:
+        await ensure_indexes(self.bot.ddb)
+        scans = await warn_on_collection_scans(self.bot.ddb)
+        logger.info(
+            "Database indexes are ready"
+            + (
+                f", but {scans} hot {'query is' if scans == 1 else 'queries are'} still scanning whole collections."
+                if scans > 0
+                else "."
+            )
+        )
+
     @commands.Cog.listener("on_ready")
     async def describe_user(self) -> None:
         # self.bot.user will always be ClientUser after on_ready is fired
@@ -43,6 +59,28 @@ class Startup(commands.Cog):
             f"in {len(self.bot.guilds)} {'guild' if len(self.bot.guilds) == 1 else 'guilds'}"
         )
 
+    @commands.Cog.listener("on_ready")
+    async def warm_guild_documents(self) -> None:
+        # on_ready fires again after every reconnect; by then the caches are already warm.
+        if self._warmed_up:
+            return
+        self._warmed_up = True
+
+        batch_size = int(self.bot.config.get("PEPPERCORD_PREFETCH_BATCH_SIZE", "500"))
+        if batch_size <= 0:
+            return
+
+        started = perf_counter()
+        total = 0
+        async for loaded in self.bot.prefetch_guild_documents(
+            (guild.id for guild in self.bot.guilds), batch_size=batch_size
+        ):
+            total += loaded
+            logger.debug(f"Prefetched {total} guild documents so far...")
+        logger.info(
+            f"Prefetched {total} guild {'document' if total == 1 else 'documents'} in {perf_counter() - started:.2f}s."
+        )
+
 
 async def setup(bot: CustomBot) -> None:
     await bot.add_cog(Startup(bot))
@@ -315,7 +315,7 @@ class Minecraft(Cog):
     ) -> None:
         logger.debug(
             f"Checking for server status changes in {document._collection.name} "
-            f"{await document.safe_subscript('_id')} {server}..."
+            f"{document['_id']} {server}..."
         )
 
         server_address = server["address"]
@@ -330,7 +330,7 @@ class Minecraft(Cog):
         if channel is None:
             logger.warning(
                 f"Could not find channel {channel_id} in {document._collection.name} "
-                f"{await document.safe_subscript('_id')}"
+                f"{document['_id']}"
             )
             return
 
@@ -371,7 +371,7 @@ class Minecraft(Cog):
             except Forbidden:
                 logger.warning(
                     f"Could not send message to {channel_id} in {document._collection.name} "
-                    f"{document.safe_subscript('_id')}"
+                    f"{document['_id']}"
                 )
             await document.update_db(
                 {
@@ -389,10 +389,10 @@ class Minecraft(Cog):
     async def _check_for_server_updates_document(self, document: PCDocument) -> None:
         logger.debug(
             f"Checking for server status changes in {document._collection.name} "
-            f"{await document.safe_subscript("_id")}..."
+            f"{document["_id"]}..."
         )
         async with TaskGroup() as tg:
-            for server in await document.safe_get("minecraft_servers", []):
+            for server in document.get("minecraft_servers", []):
                 tg.create_task(
                     self._check_for_server_updates_single_server(document, server)
                 )
@@ -402,8 +402,9 @@ class Minecraft(Cog):
         logger.debug("Checking for server status changes...")
 
         # first step: get any documents in either the users or guild collection that have minecraft_servers set
+        # (queried by address, which is what's indexed)
         user_collection = self.bot.ddb.get_collection("user")
-        user_query = {"minecraft_servers": {"$exists": True}}
+        user_query = {"minecraft_servers.address": {"$exists": True}}
         raw_user_documents = await user_collection.find(user_query).to_list(length=None)
         user_documents = [
             document.wrap(user_collection, user_query)
@@ -411,7 +412,7 @@ class Minecraft(Cog):
         ]
 
         guild_collection = self.bot.ddb.get_collection("guild")
-        guild_query = {"minecraft_servers": {"$exists": True}}
+        guild_query = {"minecraft_servers.address": {"$exists": True}}
         raw_guild_documents = await guild_collection.find(guild_query).to_list(
             length=None
         )
@@ -496,7 +497,7 @@ class Minecraft(Cog):
             )
 
             if isinstance(final_channel, DMChannel):
-                await ctx["author_document"].update_db(
+                await (await ctx["author_document"]).update_db(
                     {
                         "$push": {
                             "minecraft_servers": {
@@ -509,7 +510,7 @@ class Minecraft(Cog):
                     }
                 )
             else:
-                await ctx["guild_document"].update_db(
+                await (await ctx["guild_document"]).update_db(
                     {
                         "$push": {
                             "minecraft_servers": {
@@ -565,7 +566,7 @@ class Minecraft(Cog):
                 )  # this command can't be called in group channels
 
             if isinstance(final_channel, DMChannel):
-                await ctx["author_document"].update_db(
+                await (await ctx["author_document"]).update_db(
                     {
                         "$pull": {
                             "minecraft_servers": {
@@ -577,7 +578,7 @@ class Minecraft(Cog):
                     }
                 )
             else:
-                await ctx["guild_document"].update_db(
+                await (await ctx["guild_document"]).update_db(
                     {
                         "$pull": {
                             "minecraft_servers": {
@@ -1,11 +1,18 @@
+from asyncio import Task, create_task, gather
+from logging import getLogger
 from typing import Optional, Union
 
 import discord
 from discord.ext import commands
 
-from utils.checks.blacklisted import is_blacklisted, EBlacklisted
+from utils.checks.blacklisted import BlacklistIndex, is_blacklisted, EBlacklisted
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
+from utils.changes import DocumentChange
+
+logger = getLogger(__name__)
+
+BLACKLIST_INVALIDATION_TOPIC = "blacklist"
 
 
 class Blacklist(commands.Cog):
@@ -14,9 +21,85 @@ class Blacklist(commands.Cog):
 
     def __init__(self, bot: CustomBot) -> None:
         self.bot = bot
+        # Refreshes triggered by other processes; kept here so they aren't garbage collected while they run
+        self._refreshes: set[Task[None]] = set()
+
+    async def cog_load(self) -> None:
+        guilds, users = await gather(
+            self._load_blacklisted("guild"), self._load_blacklisted("user")
+        )
+        self.bot["blacklist"] = BlacklistIndex(guilds, users)
+        logger.debug(
+            f"Loaded {len(guilds)} blacklisted guilds and {len(users)} blacklisted users."
+        )
+        self.bot.invalidations.subscribe(
+            BLACKLIST_INVALIDATION_TOPIC, self._on_blacklist_invalidated
+        )
+        for collection_name in ("guild", "user"):
+            self.bot.subscribe_document_changes(
+                collection_name, ("blacklisted",), self._on_blacklisted_changed
+            )
+
+    def cog_unload(self) -> None:  # type: ignore[override]  # discord exports wrong
+        self.bot.invalidations.unsubscribe(
+            BLACKLIST_INVALIDATION_TOPIC, self._on_blacklist_invalidated
+        )
+        for collection_name in ("guild", "user"):
+            self.bot.unsubscribe_document_changes(
+                collection_name, self._on_blacklisted_changed
+            )
+        del self.bot["blacklist"]
+
+    async def _load_blacklisted(self, collection_name: str) -> set[int]:
+        return {
+            document["_id"]
+            async for document in self.bot.ddb[collection_name].find(
+                {"blacklisted": True}, {"_id": True}
+            )
+        }
+
+    def _on_blacklist_invalidated(self, key: str) -> None:
+        # The message only says what changed, not how; the database is the source of truth.
+        task = create_task(self._refresh_entity(key))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _on_blacklisted_changed(self, change: DocumentChange) -> None:
+        await self._refresh_entity(f"{change.collection}:{change.document_id}")
+
+    async def _refresh_entity(self, key: str) -> None:
+        collection_name, raw_id = key.split(":")
+        entity_id = int(raw_id)
+        document = await self.bot.ddb[collection_name].find_one(
+            {"_id": entity_id}, {"blacklisted": True}
+        )
+        blacklisted = document is not None and bool(document.get("blacklisted", False))
+        if collection_name == "guild":
+            self.bot["blacklist"].set_guild(entity_id, blacklisted)
+        else:
+            self.bot["blacklist"].set_user(entity_id, blacklisted)
+
+    async def _set_blacklisted(
+        self,
+        entity: Union[discord.User, discord.Member, discord.Guild],
+        blacklisted: bool,
+    ) -> None:
+        if isinstance(entity, discord.Guild):
+            document = await self.bot.get_guild_document(
+                entity, fields=("blacklisted",)
+            )
+            await document.update_db({"$set": {"blacklisted": blacklisted}})
+            self.bot["blacklist"].set_guild(entity.id, blacklisted)
+            key = f"guild:{entity.id}"
+        else:
+            document = await self.bot.get_user_document(entity, fields=("blacklisted",))
+            await document.update_db({"$set": {"blacklisted": blacklisted}})
+            self.bot["blacklist"].set_user(entity.id, blacklisted)
+            key = f"user:{entity.id}"
+        await self.bot.invalidations.publish(BLACKLIST_INVALIDATION_TOPIC, key)
 
     async def bot_check(self, ctx: CustomContext) -> bool:  # type: ignore[override]  # bad types exported
-        if await is_blacklisted(ctx) or (
+        if is_blacklisted(ctx) or (
             ctx.bot.config.get("PEPPERCORD_TESTGUILDS") is not None
             and ctx.guild is not None
             and ctx.guild.id
@@ -43,11 +126,7 @@ class Blacklist(commands.Cog):
         entity = entity or ctx.guild
         if entity is None:
             raise RuntimeError("No entity could be determined!")
-        if isinstance(entity, discord.Guild):
-            document = await ctx.bot.get_guild_document(entity)
-        else:
-            document = await ctx.bot.get_user_document(entity)
-        await document.update_db({"$set": {"blacklisted": True}})
+        await self._set_blacklisted(entity, True)
         await ctx.send(f"Blacklisted {entity.name}.", ephemeral=True)
 
     @commands.command()
@@ -61,11 +140,7 @@ class Blacklist(commands.Cog):
         entity = entity or ctx.guild
         if entity is None:
             raise RuntimeError("No entity could be determined!")
-        if isinstance(entity, discord.Guild):
-            document = await ctx.bot.get_guild_document(entity)
-        elif isinstance(entity, (discord.Member, discord.User)):
-            document = await ctx.bot.get_user_document(entity)
-        await document.update_db({"$set": {"blacklisted": False}})
+        await self._set_blacklisted(entity, False)
         await ctx.send(f"Unblacklisted {entity.name}.", ephemeral=True)
 
 
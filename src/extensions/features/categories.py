@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+from asyncio import Task, create_task, sleep
+from logging import getLogger
 from typing import TYPE_CHECKING, Sequence
-from discord import CategoryChannel, Embed, Message, Thread
+
+from discord import CategoryChannel, Embed, HTTPException, Message, Thread
+from discord.abc import GuildChannel
 from discord.app_commands import (
     default_permissions,
     guild_only as ac_guild_only,
@@ -18,6 +22,12 @@ from discord.ext.menus import ListPageSource, MenuPages
 
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
+from utils.bots.messages import MessageEnvelope
+
+if TYPE_CHECKING:
+    from discord.types.guild import ChannelPositionUpdate
+
+logger = getLogger(__name__)
 
 # Because ListPageSource comes from legacy untyped code and is being patched over with a stub, we need to do this to make sure it never gets subscripted at runtime.
 if TYPE_CHECKING:
@@ -59,26 +69,125 @@ class CategoryList(_CategoryList_Base):
         return embed
 
 
+def _is_first_in_category(channel: GuildChannel, category: CategoryChannel) -> bool:
+    # category.channels is sorted the same way the client sorts them.
+    # _sorting_bucket separates channels that are ordered independently of each other (i.e. text & voice)
+    for sibling in category.channels:
+        if sibling._sorting_bucket == channel._sorting_bucket:
+            return sibling.id == channel.id
+    return False
+
+
+def autosort_payload(
+    category: CategoryChannel, active_channel_ids: Sequence[int]
+) -> list[ChannelPositionUpdate]:
+    """
+    Gets the bulk channel position update that moves channels to the top of their category,
+    with the most recently active channel (the last one in active_channel_ids) first.
+    Only the positions already used in the category are reused, and only the channels that actually move are included.
+    """
+    buckets: dict[int, list[GuildChannel]] = {}
+    for channel in category.channels:
+        buckets.setdefault(channel._sorting_bucket, []).append(channel)
+
+    activity = {channel_id: i for i, channel_id in enumerate(active_channel_ids)}
+
+    payload: list[ChannelPositionUpdate] = []
+    for channels in buckets.values():
+        active = sorted(
+            (channel for channel in channels if channel.id in activity),
+            key=lambda channel: activity[channel.id],
+            reverse=True,
+        )
+        if not active:
+            continue
+        new_order = active + [
+            channel for channel in channels if channel.id not in activity
+        ]
+
+        positions: list[int] = []
+        for position in sorted(channel.position for channel in channels):
+            # Discord allows duplicate positions, which would leave the order up to the channel IDs.
+            positions.append(
+                max(position, positions[-1] + 1) if positions else position
+            )
+
+        for moved, position in zip(new_order, positions):
+            if moved.position != position:
+                payload.append({"id": moved.id, "position": position})
+    return payload
+
+
 class Categories(Cog):
     """A set of tools for managing categories in a Discord server."""
 
     def __init__(self, bot: CustomBot) -> None:
         self.bot: CustomBot = bot
 
-    @Cog.listener()
-    async def on_message(self, message: Message) -> None:
-        ctx: CustomContext = await self.bot.get_context(message)
+        # Moves are coalesced into one bulk update per category per window, to spare our rate limits on busy categories.
+        self._debounce = float(bot.config.get("PEPPERCORD_AUTOSORT_DEBOUNCE", "5"))
+        # Category ID -> IDs of channels with activity in this window, oldest first
+        self._pending_moves: dict[int, list[int]] = {}
+        self._scheduled_moves: dict[int, Task[None]] = {}
+
+    async def cog_load(self) -> None:
+        self.bot.add_message_handler(self.handle_message, guilds_only=True)
+
+    def cog_unload(self) -> None:  # type: ignore[override]  # discord exports wrong
+        self.bot.remove_message_handler(self.handle_message)
+        for task in self._scheduled_moves.values():
+            task.cancel()
+
+    def _queue_move(self, channel: GuildChannel, category: CategoryChannel) -> None:
+        pending = self._pending_moves.setdefault(category.id, [])
+        if channel.id in pending:
+            pending.remove(channel.id)
+        pending.append(channel.id)
+
+        if category.id not in self._scheduled_moves:
+            self._scheduled_moves[category.id] = create_task(
+                self._flush_moves(category.id), name=f"autosort: {category.id}"
+            )
+
+    async def _flush_moves(self, category_id: int) -> None:
+        try:
+            await sleep(self._debounce)
+        finally:
+            del self._scheduled_moves[category_id]
+        active_channel_ids = self._pending_moves.pop(category_id, [])
+
+        # Positions are read from the gateway cache only now, so that everything that happened during the window is accounted for.
+        category = self.bot.get_channel(category_id)
+        if not isinstance(category, CategoryChannel) or not active_channel_ids:
+            return
+        payload = autosort_payload(category, active_channel_ids)
+        if not payload:
+            return
+
+        try:
+            await self.bot.http.bulk_channel_update(
+                category.guild.id, payload, reason="AutoSort"
+            )
+        except HTTPException as e:
+            logger.warning(f"Failed to autosort {category} in {category.guild}: {e}")
+
+    async def handle_message(self, envelope: MessageEnvelope) -> None:
+        channel = envelope.message.channel
         if (
-            ctx.guild is not None
-            and ctx.channel.category is not None  # type: ignore[union-attr]  # guaranteed by ctx.guild is not None
-            and not isinstance(ctx.channel, Thread)
-            and hasattr(ctx.channel, "position")
+            channel.category is not None  # type: ignore[union-attr]  # guaranteed by guilds_only
+            and not isinstance(channel, Thread)
+            and hasattr(channel, "position")
             and (
-                ctx.channel.category.id  # type: ignore[union-attr]  # guaranteed by ctx.guild is not None
-                in await ctx["guild_document"].safe_get("autosort_categories", [])
+                channel.category.id  # type: ignore[union-attr]  # guaranteed by guilds_only
+                in (await envelope.guild_document()).get("autosort_categories", [])
             )
         ):
-            await ctx.channel.edit(position=ctx.channel.category.position)  # type: ignore[union-attr]  # guaranteed by ctx.guild is not None
+            category: CategoryChannel = channel.category  # type: ignore[union-attr]  # guaranteed by guilds_only
+            if category.id not in self._pending_moves and _is_first_in_category(
+                channel, category  # type: ignore[arg-type]  # guaranteed by the hasattr
+            ):
+                return  # Already where it would be moved to.
+            self._queue_move(channel, category)  # type: ignore[arg-type]  # guaranteed by the hasattr
 
     @hybrid_group(fallback="list")  # type: ignore[arg-type]  # bad d.py export
     @bot_has_permissions(manage_channels=True)
@@ -93,13 +202,14 @@ class Categories(Cog):
         """
         assert ctx.guild is not None  # guaranteed at runtime
         async with ctx.typing(ephemeral=True):
+            guild_document = await ctx["guild_document"]
             menu: "MenuPages[CustomBot, CustomContext, CategoryList]" = MenuPages(
                 CategoryList(
                     [
                         category
                         for category in [
                             ctx.guild.get_channel(category_id)
-                            for category_id in await ctx["guild_document"].safe_get(
+                            for category_id in guild_document.get(
                                 "autosort_categories", []
                             )
                         ]
@@ -123,7 +233,7 @@ class Categories(Cog):
     async def add(self, ctx: CustomContext, category: CategoryChannel) -> None:
         """Adds a category to the list of categories with AutoSort."""
         async with ctx.typing(ephemeral=True):
-            await ctx["guild_document"].update_db(
+            await (await ctx["guild_document"]).update_db(
                 {"$push": {"autosort_categories": category.id}}
             )
             await ctx.send(f"Added {category.mention}.", ephemeral=True)
@@ -136,7 +246,7 @@ class Categories(Cog):
     async def remove(self, ctx: CustomContext, category: CategoryChannel) -> None:
         """Removes a category from the list of categories with AutoSort."""
         async with ctx.typing(ephemeral=True):
-            await ctx["guild_document"].update_db(
+            await (await ctx["guild_document"]).update_db(
                 {"pull": {"autosort_categories": category.id}}
             )
             await ctx.send(f"Removed {category.mention}.", ephemeral=True)
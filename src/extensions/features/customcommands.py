@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Optional, Self, Sequence, cast
+from asyncio import Task, create_task
+from collections import deque
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Mapping, Optional, Self, Sequence, cast
 
 import discord
 from discord.app_commands import describe
@@ -12,6 +15,22 @@ from discord.ext.menus import ListPageSource, MenuPages
 from utils.attachments import find_url_recurse
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
+from utils.bots.messages import MessageEnvelope
+from utils.cache import LRUCache
+from utils.changes import DocumentChange
+from utils.database import PCDocument
+from utils.ratelimit import CooldownMapping
+
+logger = getLogger(__name__)
+
+CUSTOM_COMMANDS_INVALIDATION_TOPIC = "custom_commands"
+
+# Everything a CustomCommandPrefilter is built from.
+_PREFILTER_PROJECTION = {
+    "commands": True,
+    "cc_is_case_insensitive": True,
+    "cc_exact": True,
+}
 
 
 class CustomCommand:
@@ -86,75 +105,229 @@ class CustomCommandSource(_CustomCommandSource_Base):
         return base_embed
 
 
-def match_commands(
-    possible_commands: Sequence[CustomCommand],
-    query: str,
-    *,
-    case_insensitive: bool = True,
-    first_word_only: bool = True,
-    starts_with: bool = True,
-    exact: bool = True,
-) -> Optional[CustomCommand]:
-    """Attempts to find a CustomCommand from a list of CustomCommands."""
+class _TrieNode:
+    __slots__ = ("children", "index")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.index: int | None = None
+
+
+class _PrefixTrie:
+    """Finds the earliest-registered key that the query starts with."""
+
+    def __init__(self, keys: Sequence[str]) -> None:
+        self._root = _TrieNode()
+        for index, key in enumerate(keys):
+            node = self._root
+            for character in key:
+                node = node.children.setdefault(character, _TrieNode())
+            if node.index is None:
+                node.index = index
+
+    def find(self, query: str) -> int | None:
+        best = self._root.index
+        node = self._root
+        for character in query:
+            if best == 0:
+                break
+            next_node = node.children.get(character)
+            if next_node is None:
+                break
+            node = next_node
+            if node.index is not None and (best is None or node.index < best):
+                best = node.index
+        return best
+
+
+class _AhoCorasick:
+    """Finds the earliest-registered key that appears anywhere in the query."""
+
+    def __init__(self, keys: Sequence[str]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        # For each state, the earliest key that ends at it or at any of its suffixes.
+        self._output: list[int | None] = [None]
+        self._fail: list[int] = [0]
+
+        for index, key in enumerate(keys):
+            state = 0
+            for character in key:
+                next_state = self._goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._output.append(None)
+                    self._fail.append(0)
+                    self._goto[state][character] = next_state
+                state = next_state
+            if self._output[state] is None:
+                self._output[state] = index
+
+        # Breadth-first, so that every failure link points at a state that is already finished.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and character not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(character, 0)
+                self._output[next_state] = self._earliest(
+                    self._output[next_state], self._output[self._fail[next_state]]
+                )
+                queue.append(next_state)
+
+    @staticmethod
+    def _earliest(first: int | None, second: int | None) -> int | None:
+        if first is None:
+            return second
+        if second is None:
+            return first
+        return min(first, second)
+
+    def find(self, query: str) -> int | None:
+        best = self._output[0]
+        state = 0
+        for character in query:
+            if best == 0:
+                break
+            while state and character not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(character, 0)
+            best = self._earliest(best, self._output[state])
+        return best
+
+
+class CompiledCustomCommands:
+    """
+    A guild's custom commands, compiled once for matching against many messages.
+    The query (or its first word, if first_word_only) matches a command that is equal to it (if exact), that it starts with
+    (if starts_with), or that it contains (otherwise), optionally ignoring case. The earliest command in the list that matches wins.
+    This is done without touching every command for every message.
+    """
+
+    def __init__(
+        self,
+        possible_commands: Sequence[CustomCommand],
+        *,
+        case_insensitive: bool = True,
+        first_word_only: bool = True,
+        starts_with: bool = True,
+        exact: bool = True,
+        source: Any = None,
+    ) -> None:
+        self._commands = possible_commands
+        self._case_insensitive = case_insensitive
+        self._first_word_only = first_word_only
+        self._starts_with = starts_with
+        self._exact = exact
+        self._source = source
+
+        keys = [self._normalize(command.command) for command in possible_commands]
+        self._exact_index: dict[str, int] | None = None
+        self._trie: _PrefixTrie | None = None
+        self._automaton: _AhoCorasick | None = None
+        if exact:
+            self._exact_index = {}
+            for index, key in enumerate(keys):
+                self._exact_index.setdefault(key, index)
+        elif starts_with:
+            self._trie = _PrefixTrie(keys)
+        else:
+            self._automaton = _AhoCorasick(keys)
 
-    if first_word_only:
-        query = query.strip().split()[0] if len(query.strip().split()) > 0 else ""
+    @classmethod
+    def from_document(cls, document: Mapping[str, Any]) -> Self:
+        commands_dict = document.get("commands", {})
+        return cls(
+            CustomCommand.from_dict(commands_dict),
+            case_insensitive=document.get("cc_is_case_insensitive", True),
+            first_word_only=document.get("cc_first_word_only", True),
+            starts_with=document.get("cc_starts_with", True),
+            exact=document.get("cc_exact", True),
+            source=commands_dict,
+        )
 
-    for possible_command in possible_commands:
-        if (
-            case_insensitive
-            and (
-                (exact and query.lower() == possible_command.command.lower())
-                or (
-                    not exact
-                    and (
-                        (
-                            starts_with
-                            and query.lower().startswith(
-                                possible_command.command.lower()
-                            )
-                        )
-                        or (
-                            not starts_with
-                            and possible_command.command.lower() in query.lower()
-                        )
-                    )
-                )
-            )
-            or (
-                not case_insensitive
-                and (
-                    (exact and query == possible_command.command)
-                    or (
-                        not exact
-                        and (
-                            (starts_with and query.startswith(possible_command.command))
-                            or (not starts_with and possible_command.command in query)
-                        )
-                    )
-                )
-            )
-        ):
-            return possible_command
+    def is_compiled_from(self, document: Mapping[str, Any]) -> bool:
+        """Checks that this is still up-to-date with a guild's document."""
+        return (
+            document.get("commands", {}) is self._source
+            and document.get("cc_is_case_insensitive", True) == self._case_insensitive
+            and document.get("cc_first_word_only", True) == self._first_word_only
+            and document.get("cc_starts_with", True) == self._starts_with
+            and document.get("cc_exact", True) == self._exact
+        )
+
+    def _normalize(self, text: str) -> str:
+        return text.lower() if self._case_insensitive else text
+
+    def match(self, query: str) -> Optional[CustomCommand]:
+        if self._first_word_only:
+            words = query.split()
+            query = words[0] if len(words) > 0 else ""
+        query = self._normalize(query)
+
+        index: int | None
+        if self._exact_index is not None:
+            index = self._exact_index.get(query)
+        elif self._trie is not None:
+            index = self._trie.find(query)
         else:
-            continue
-    else:
-        return None  # No CC found
+            assert self._automaton is not None
+            index = self._automaton.find(query)
+
+        return self._commands[index] if index is not None else None
+
+
+def _first_token(text: str) -> str:
+    words = text.split(maxsplit=1)
+    return words[0] if len(words) > 0 else ""
 
 
-def get_custom_command_from_guild(
+class CustomCommandPrefilter:
+    """
+    A cheap, synchronous test for whether a message could possibly trigger a guild's custom commands.
+    False positives are fine (the full matcher still runs), but a false negative would drop a custom command, so anything uncertain passes.
+    """
+
+    def __init__(self, document: Mapping[str, Any]) -> None:
+        self._case_insensitive: bool = document.get("cc_is_case_insensitive", True)
+        # Outside of exact mode, a trigger can be anywhere in the first word (or message), so there is nothing to narrow down.
+        self._first_tokens: frozenset[str] | None = (
+            frozenset(
+                _first_token(self._normalize(command))
+                for command in document.get("commands", {})
+            )
+            if document.get("cc_exact", True)
+            else None
+        )
+
+    def _normalize(self, text: str) -> str:
+        return text.lower() if self._case_insensitive else text
+
+    def may_match(self, message: discord.Message) -> bool:
+        if self._first_tokens is None:
+            return True
+        first_token = _first_token(message.content)
+        # Mentions are rewritten in clean_content, which is what is actually matched against. Don't try to predict it.
+        if "<" in first_token or "@" in first_token:
+            return True
+        return _first_token(self._normalize(first_token)) in self._first_tokens
+
+
+async def get_custom_command_from_guild(
     ctx: CustomContext, query: Optional[str] = None
 ) -> Optional[CustomCommand]:
     query = query or ctx.message.clean_content
+    assert ctx.guild is not None
+    guild_document = await ctx["guild_document"]
 
-    return match_commands(
-        CustomCommand.from_dict(ctx["guild_document"].get("commands", [])),
-        query,
-        case_insensitive=ctx["guild_document"].get("cc_is_case_insensitive", True),
-        first_word_only=ctx["guild_document"].get("cc_first_word_only", True),
-        starts_with=ctx["guild_document"].get("cc_starts_with", True),
-        exact=ctx["guild_document"].get("cc_exact", True),
-    )
+    cog = ctx.bot.get_cog("CustomCommands")
+    if isinstance(cog, CustomCommands):
+        matcher = cog.get_matcher(ctx.guild.id, guild_document)
+    else:
+        matcher = CompiledCustomCommands.from_document(guild_document)
+    return matcher.match(query)
 
 
 class CustomCommandDoesNotExist(commands.BadArgument):
@@ -166,7 +339,7 @@ class CustomCommandConverter(commands.Converter[CustomCommand]):
 
     async def convert(self, ctx: commands.Context[Any], argument: str) -> CustomCommand:
         custom_ctx = cast(CustomContext, ctx)  # known at runtime
-        custom_command = get_custom_command_from_guild(custom_ctx, argument)
+        custom_command = await get_custom_command_from_guild(custom_ctx, argument)
         if custom_command is None:
             raise CustomCommandDoesNotExist()
         else:
@@ -179,10 +352,102 @@ class CustomCommands(commands.Cog):
     def __init__(self, bot: CustomBot) -> None:
         self.bot = bot
 
-        self.cooldown = commands.CooldownMapping.from_cooldown(
-            3, 10, commands.BucketType.channel
+        self.cooldown = CooldownMapping(
+            bot.cooldowns, "custom_commands", 3, 10, commands.BucketType.channel
+        )
+
+        self._matchers: LRUCache[int, CompiledCustomCommands] = LRUCache(
+            int(bot.config.get("PEPPERCORD_CUSTOM_COMMAND_MATCHERS", "256"))
+        )
+        # Only guilds that have (or have had) custom commands are in here.
+        self._prefilters: dict[int, CustomCommandPrefilter] = {}
+        # Reloads triggered by other processes; kept here so they aren't garbage collected while they run
+        self._reloads: set[Task[None]] = set()
+
+    async def cog_load(self) -> None:
+        await self._load_prefilters()
+        self.bot.add_message_handler(
+            self.handle_message,
+            humans_only=True,
+            guilds_only=True,
+            commands=False,
+            predicate=self.may_have_custom_command,
+        )
+        self.bot.invalidations.subscribe(
+            CUSTOM_COMMANDS_INVALIDATION_TOPIC, self._on_custom_commands_invalidated
+        )
+        self.bot.subscribe_document_changes(
+            "guild", _PREFILTER_PROJECTION, self._on_guild_commands_changed
+        )
+
+    def cog_unload(self) -> None:  # type: ignore[override]  # discord exports wrong
+        self.bot.remove_message_handler(self.handle_message)
+        self.bot.invalidations.unsubscribe(
+            CUSTOM_COMMANDS_INVALIDATION_TOPIC, self._on_custom_commands_invalidated
+        )
+        self.bot.unsubscribe_document_changes("guild", self._on_guild_commands_changed)
+
+    async def _load_prefilters(self) -> None:
+        prefilters: dict[int, CustomCommandPrefilter] = {}
+        async for document in self.bot.ddb["guild"].find(
+            {"commands": {"$exists": True}},
+            _PREFILTER_PROJECTION,
+        ):
+            prefilters[document["_id"]] = CustomCommandPrefilter(document)
+        self._prefilters = prefilters
+        logger.debug(f"Loaded {len(prefilters)} guilds with custom commands.")
+
+    def may_have_custom_command(self, message: discord.Message) -> bool:
+        """Checks if a message could trigger a custom command without loading anything."""
+        if message.guild is None:
+            return False
+        prefilter = self._prefilters.get(message.guild.id)
+        return prefilter is not None and prefilter.may_match(message)
+
+    def get_matcher(
+        self, guild_id: int, guild_document: PCDocument
+    ) -> CompiledCustomCommands:
+        """Gets the compiled custom commands for a guild, compiling them if they aren't cached or are out of date."""
+        matcher = self._matchers.get(guild_id)
+        if matcher is None or not matcher.is_compiled_from(guild_document):
+            matcher = CompiledCustomCommands.from_document(guild_document)
+            self._matchers.put(guild_id, matcher)
+        return matcher
+
+    def _update_guild(self, guild_id: int, document: Mapping[str, Any] | None) -> None:
+        self._matchers.pop(guild_id)
+        if document is not None and document.get("commands") is not None:
+            self._prefilters[guild_id] = CustomCommandPrefilter(document)
+        else:
+            self._prefilters.pop(guild_id, None)
+
+    async def refresh_guild(self, guild_id: int, guild_document: PCDocument) -> None:
+        """
+        Updates the compiled commands and pre-filter for a guild after its document has changed,
+        and tells other processes to do the same.
+        """
+        self._update_guild(guild_id, guild_document)
+        await self.bot.invalidations.publish(
+            CUSTOM_COMMANDS_INVALIDATION_TOPIC, str(guild_id)
+        )
+
+    async def _reload_guild(self, guild_id: int) -> None:
+        self._update_guild(
+            guild_id,
+            await self.bot.ddb["guild"].find_one(
+                {"_id": guild_id}, _PREFILTER_PROJECTION
+            ),
         )
 
+    def _on_custom_commands_invalidated(self, guild_id: str) -> None:
+        # The message only says which guild changed; the database is the source of truth.
+        task = create_task(self._reload_guild(int(guild_id)))
+        self._reloads.add(task)
+        task.add_done_callback(self._reloads.discard)
+
+    async def _on_guild_commands_changed(self, change: DocumentChange) -> None:
+        await self._reload_guild(change.document_id)
+
     @commands.Cog.listener()
     async def on_custom_command_success(
         self, custom_command: CustomCommand, ctx: CustomContext
@@ -201,49 +466,34 @@ class CustomCommands(commands.Cog):
         else:
             await ctx.message.add_reaction("❌")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
-        ctx = await self.bot.get_context(message, cls=CustomContext)
+    async def handle_message(self, envelope: MessageEnvelope) -> None:
+        # Lots of conditions to get here (see the registration in cog_load).
+        # Oh well, that will happen if you have to make your own command invocation system.
+        guild_document = await envelope.guild_document()
+        if guild_document.get("commands") is None:
+            return
 
-        if (
-            not ctx.author.bot
-            and ctx.guild is not None
-            and (await ctx["guild_document"].safe_get("commands")) is not None
-            and not ctx.valid
-        ):
-            # Lots of conditions to get here.
-            # Oh well, that will happen if you have to make your own command invocation system.
-
-            custom_command = get_custom_command_from_guild(ctx)
-
-            if custom_command is None:
-                return
-
-            ctx.bot.dispatch("custom_command", custom_command, ctx)
-
-            try:
-                bucket = cast(
-                    commands.Cooldown, self.cooldown.get_bucket(ctx.message)
-                )  # guaranteed at runtime
-                retry_after = bucket.update_rate_limit()
-
-                if retry_after is not None and isinstance(
-                    self.cooldown.type, commands.BucketType
-                ):
-                    raise commands.CommandOnCooldown(
-                        bucket, retry_after, self.cooldown.type
-                    )
-                elif retry_after is not None:
-                    # Not sure why we would get here.
-                    raise commands.CommandOnCooldown(
-                        bucket, retry_after, commands.BucketType.default
-                    )
-
-                await custom_command.execute(ctx)
-            except Exception as exception:
-                ctx.bot.dispatch("custom_command_error", custom_command, ctx, exception)
-            else:
-                ctx.bot.dispatch("custom_command_success", custom_command, ctx)
+        ctx = await envelope.context()
+        custom_command = await get_custom_command_from_guild(ctx)
+
+        if custom_command is None:
+            return
+
+        ctx.bot.dispatch("custom_command", custom_command, ctx)
+
+        try:
+            retry_after = await self.cooldown.update_rate_limit(ctx.message)
+
+            if retry_after is not None:
+                raise commands.CommandOnCooldown(
+                    self.cooldown.cooldown, retry_after, self.cooldown.type
+                )
+
+            await custom_command.execute(ctx)
+        except Exception as exception:
+            ctx.bot.dispatch("custom_command_error", custom_command, ctx, exception)
+        else:
+            ctx.bot.dispatch("custom_command_success", custom_command, ctx)
 
     @hybrid_group(aliases=["cc"], fallback="list")  # type: ignore[arg-type]  # valid at runtime; bad d.py type
     @ac_guild_only()
@@ -251,7 +501,7 @@ class CustomCommands(commands.Cog):
     async def customcommands(self, ctx: CustomContext) -> None:
         """Lists all custom commands currently on the server."""
         assert ctx.guild is not None  # guaranteed at runtime with checks
-        commands_dict = await ctx["guild_document"].safe_get("commands", {})
+        commands_dict = (await ctx["guild_document"]).get("commands", {})
         custom_commands = CustomCommand.from_dict(commands_dict)
         source = CustomCommandSource(custom_commands, ctx.guild)
         pages: "menus.MenuPages[CustomBot, CustomContext, CustomCommandSource]" = (
@@ -285,9 +535,10 @@ class CustomCommands(commands.Cog):
         self, ctx: CustomContext, *, is_case_sensitive: bool = False
     ) -> None:
         """Configures case sensitivity of the CustomCommand finder."""
-        await ctx["guild_document"].update_db(
+        await (await ctx["guild_document"]).update_db(
             {"$set": {"cc_is_case_insensitive": not is_case_sensitive}}
         )
+        await self.refresh_guild(ctx.guild.id, await ctx["guild_document"])  # type: ignore[union-attr]  # guaranteed at runtime
         await ctx.send("Settings updated.", ephemeral=True)
 
     @match.command()  # type: ignore[arg-type]  # valid at runtime; bad d.py type
@@ -296,9 +547,10 @@ class CustomCommands(commands.Cog):
         self, ctx: CustomContext, *, first_word_only: bool = True
     ) -> None:
         """Configures if only the first word of a message should be checked for a custom command."""
-        await ctx["guild_document"].update_db(
+        await (await ctx["guild_document"]).update_db(
             {"$set": {"cc_first_word_only": first_word_only}}
         )
+        await self.refresh_guild(ctx.guild.id, await ctx["guild_document"])  # type: ignore[union-attr]  # guaranteed at runtime
         await ctx.send("Settings updated.", ephemeral=True)
 
     @match.command()  # type: ignore[arg-type]  # valid at runtime; bad d.py type
@@ -307,15 +559,19 @@ class CustomCommands(commands.Cog):
         self, ctx: CustomContext, *, must_start_with: bool = True
     ) -> None:
         """Configures if only the start of a message should be checked for a custom command."""
-        await ctx["guild_document"].update_db(
+        await (await ctx["guild_document"]).update_db(
             {"$set": {"cc_starts_with": must_start_with}}
         )
+        await self.refresh_guild(ctx.guild.id, await ctx["guild_document"])  # type: ignore[union-attr]  # guaranteed at runtime
         await ctx.send("Settings updated.", ephemeral=True)
 
     @match.command()  # type: ignore[arg-type]  # valid at runtime; bad d.py type
     async def exact(self, ctx: CustomContext, *, must_be_exact: bool = True) -> None:
         """Configures if only the start of a message should be checked for a custom command."""
-        await ctx["guild_document"].update_db({"$set": {"cc_exact": must_be_exact}})
+        await (await ctx["guild_document"]).update_db(
+            {"$set": {"cc_exact": must_be_exact}}
+        )
+        await self.refresh_guild(ctx.guild.id, await ctx["guild_document"])  # type: ignore[union-attr]  # guaranteed at runtime
         await ctx.send("Settings updated.", ephemeral=True)
 
     @customcommands.command()  # type: ignore[arg-type]  # valid at runtime; bad d.py type
@@ -343,9 +599,10 @@ class CustomCommands(commands.Cog):
             if message is not None
             else (await find_url_recurse(ctx.message, ctx.bot))[0]
         )
-        await ctx["guild_document"].update_db(
+        await (await ctx["guild_document"]).update_db(
             {"$set": {f"commands.{command}": message}}
         )
+        await self.refresh_guild(ctx.guild.id, await ctx["guild_document"])  # type: ignore[union-attr]  # guaranteed at runtime
         await ctx.send("Custom command added.", ephemeral=True)
 
     @customcommands.command()  # type: ignore[arg-type]  # valid at runtime; bad d.py type
@@ -359,14 +616,14 @@ class CustomCommands(commands.Cog):
         command: str,
     ) -> None:
         """Deletes a custom command from the guild."""
-        custom_commands_obj = await ctx["guild_document"].safe_get("commands")
+        guild_document = await ctx["guild_document"]
+        custom_commands_obj = guild_document.get("commands")
         if (
             custom_commands_obj is not None
             and custom_commands_obj.get(command) is not None
         ):
-            await ctx["guild_document"].update_db(
-                {"$unset": {f"commands.{command}": 1}}
-            )
+            await guild_document.update_db({"$unset": {f"commands.{command}": 1}})
+            await self.refresh_guild(ctx.guild.id, await ctx["guild_document"])  # type: ignore[union-attr]  # guaranteed at runtime
             await ctx.send("Custom command removed.", ephemeral=True)
         else:
             raise commands.CommandNotFound(f"{command} is not registered.")
@@ -1,9 +1,11 @@
+from asyncio import CancelledError, Task, create_task, wait
 from datetime import datetime
-from typing import Any, cast
+from logging import getLogger
+from time import monotonic
+from typing import Any, Iterable, cast
 
 from discord import (
     Member,
-    Guild,
     HTTPException,
     Status,
     Interaction,
@@ -13,15 +15,27 @@ from discord import (
 from discord.app_commands import describe, context_menu
 from discord.app_commands import guild_only as ac_guild_only
 from discord.ext.commands import Cog, guild_only, hybrid_group, Greedy, Command
+from discord.ext.tasks import loop
 from discord.utils import escape_markdown, format_dt
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
 
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
-from utils.database import PCDocument
+from utils.changes import DocumentChange
+from utils.database import PCDocument, versioned
 from utils.misc import status_breakdown
 
+logger = getLogger(__name__)
+
 WATCH_CM = "Watch Status"
 UNWATCH_CM = "Stop Watching Status"
+WATCHERS_INVALIDATION_TOPIC = "watchers"
+
+
+def parse_watcher_scope(scope: str) -> tuple[int, int]:
+    """Parses a "guild-user" entry of a user document's watchers into (guild ID, watcher ID)."""
+    return int(scope.split("-")[0]), int(scope.split("-")[-1])
 
 
 @context_menu(name=WATCH_CM)
@@ -56,60 +70,201 @@ class StatusWatch(Cog):
     def __init__(self, bot: CustomBot) -> None:
         self.bot: CustomBot = bot
 
-    def cog_load(self) -> None:  # type: ignore[override]  # discord exports wrong
+        # A user's last_online is recorded at most once every interval while they stay online.
+        self._last_online_interval = float(
+            bot.config.get("PEPPERCORD_LAST_ONLINE_INTERVAL", "60")
+        )
+        self._last_online_recorded_at: dict[int, float] = {}  # monotonic
+        # Timestamps that haven't been written to the database yet, and ones that are being written right now
+        self._pending_last_online: dict[int, datetime] = {}
+        self._flushing_last_online: dict[int, datetime] = {}
+
+        # (guild ID, watched user ID) -> IDs of the users watching them
+        # Mirrors the "watchers" field of user documents so presence updates don't need to read them.
+        self._watchers: dict[tuple[int, int], set[int]] = {}
+        # Reloads triggered by other processes; kept here so they aren't garbage collected while they run
+        self._reloads: set[Task[None]] = set()
+
+    async def cog_load(self) -> None:
         self.bot.tree.add_command(watch_cm_pred)
         self.bot.tree.add_command(unwatch_cm_pred)
+        self.flush_last_online.start()
+        await self._load_watchers()
+        self.bot.invalidations.subscribe(
+            WATCHERS_INVALIDATION_TOPIC, self._on_watchers_invalidated
+        )
+        self.bot.subscribe_document_changes(
+            "user", ("watchers",), self._on_watchers_changed
+        )
+
+    async def _load_watchers(self) -> None:
+        watchers: dict[tuple[int, int], set[int]] = {}
+        async for document in self.bot.ddb["user"].find(
+            {"watchers": {"$exists": True}}, {"watchers": True}
+        ):
+            for scope in document.get("watchers", []):
+                guild_id, watcher_id = parse_watcher_scope(scope)
+                watchers.setdefault((guild_id, document["_id"]), set()).add(watcher_id)
+        self._watchers = watchers
+        logger.debug(f"Loaded {len(watchers)} watched members.")
+
+    def _add_watcher(self, guild_id: int, user_id: int, watcher_id: int) -> None:
+        self._watchers.setdefault((guild_id, user_id), set()).add(watcher_id)
+
+    def _remove_watcher(self, guild_id: int, user_id: int, watcher_id: int) -> None:
+        watchers = self._watchers.get((guild_id, user_id))
+        if watchers is not None:
+            watchers.discard(watcher_id)
+            if not watchers:
+                del self._watchers[(guild_id, user_id)]
+
+    def _set_watchers(self, user_id: int, scopes: Iterable[str]) -> None:
+        for key in [key for key in self._watchers if key[1] == user_id]:
+            del self._watchers[key]
+        for scope in scopes:
+            guild_id, watcher_id = parse_watcher_scope(scope)
+            self._add_watcher(guild_id, user_id, watcher_id)
 
-    def cog_unload(self) -> None:  # type: ignore[override]  # discord exports wrong
+    async def _reload_watchers(self, user_id: int) -> None:
+        document = await self.bot.ddb["user"].find_one(
+            {"_id": user_id}, {"watchers": True}
+        )
+        self._set_watchers(
+            user_id, document.get("watchers", []) if document is not None else []
+        )
+
+    def _on_watchers_invalidated(self, user_id: str) -> None:
+        # The message only says whose watchers changed; the database is the source of truth.
+        task = create_task(self._reload_watchers(int(user_id)))
+        self._reloads.add(task)
+        task.add_done_callback(self._reloads.discard)
+
+    async def _on_watchers_changed(self, change: DocumentChange) -> None:
+        await self._reload_watchers(change.document_id)
+
+    async def cog_unload(self) -> None:
+        self.bot.invalidations.unsubscribe(
+            WATCHERS_INVALIDATION_TOPIC, self._on_watchers_invalidated
+        )
+        self.bot.unsubscribe_document_changes("user", self._on_watchers_changed)
         self.bot.tree.remove_command(WATCH_CM, type=AppCommandType.user)
         self.bot.tree.remove_command(UNWATCH_CM, type=AppCommandType.user)
+        await self._stop_flushing_last_online()
+
+    @loop(seconds=15)
+    async def flush_last_online(self) -> None:
+        await self._flush_last_online()
+
+    @Cog.listener("on_graceful_shutdown")
+    async def flush_last_online_on_shutdown(self) -> None:
+        await self._stop_flushing_last_online()
+
+    async def _stop_flushing_last_online(self) -> None:
+        task = self.flush_last_online.get_task()
+        self.flush_last_online.cancel()
+        if task is not None:
+            # A write that gets interrupted puts its timestamps back; wait for that before writing what's left.
+            await wait([task])
+        await self._flush_last_online()
+
+    async def _flush_last_online(self) -> None:
+        # Forget throttling state that has run out, so this doesn't grow forever.
+        cutoff = monotonic() - self._last_online_interval
+        self._last_online_recorded_at = {
+            user_id: recorded_at
+            for user_id, recorded_at in self._last_online_recorded_at.items()
+            if recorded_at > cutoff
+        }
+
+        if not self._pending_last_online:
+            return
+
+        flushing = self._flushing_last_online = self._pending_last_online
+        self._pending_last_online = {}
+        try:
+            await self.bot.ddb["user"].bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": user_id},
+                        versioned({"$set": {"last_online": last_online}}),
+                        upsert=True,
+                    )
+                    for user_id, last_online in flushing.items()
+                ],
+                ordered=False,
+            )
+        except (PyMongoError, CancelledError) as e:
+            # Setting a timestamp is idempotent, so writing one twice is harmless; losing one isn't.
+            # Anything newer that came in while we were writing wins.
+            self._pending_last_online = flushing | self._pending_last_online
+            self._flushing_last_online = {}
+            if isinstance(e, CancelledError):
+                raise
+            logger.warning(
+                f"Failed to write {len(flushing)} last_online timestamps; retrying next flush: {e}"
+            )
+            return
+
+        # The bulk write went around the documents, so bring cached copies up to date (rather than dropping them).
+        await self.bot.apply_written_user_fields(
+            {
+                user_id: {"last_online": last_online}
+                for user_id, last_online in flushing.items()
+            }
+        )
+        self._flushing_last_online = {}
 
     @Cog.listener("on_presence_update")
     async def notify(self, before: Member, after: Member) -> None:
-        document: PCDocument = await self.bot.get_user_document(after)
         if (
-            before.status != after.status and after.status is not Status.offline
+            before.status == after.status or after.status is Status.offline
         ):  # We don't care about presences here.
-            before_breakdown: str | None = status_breakdown(
-                before.desktop_status, before.mobile_status, before.web_status
-            )
-            after_breakdown: str | None = status_breakdown(
-                after.desktop_status, after.mobile_status, after.web_status
-            )
-            from_text: str = (
-                f"\nfrom `{str(before.status).title()}`{f' ({before_breakdown})' if before_breakdown else ''}"
-            )
-            for guild_id, user_id in [
-                (int(scope.split("-")[0]), int(scope.split("-")[-1]))
-                for scope in await document.safe_get("watchers", [])
-            ]:
-                try:
-                    if guild_id == after.guild.id:
-                        guild: Guild = self.bot.get_guild(
-                            guild_id
-                        ) or await self.bot.fetch_guild(guild_id)
-
-                        await (
-                            self.bot.get_user(user_id)
-                            or await self.bot.fetch_user(user_id)
-                        ).send(
-                            f"Update from {escape_markdown(guild.name)}: "
-                            f"{after.mention}'s ({escape_markdown(after.display_name)}) status has changed to "
-                            f"`{str(after.status).title()}`{f' ({after_breakdown})' if after_breakdown else ''}"
-                            f"{from_text if before.status is not Status.offline else ''}"
-                        )
-                except HTTPException:
-                    continue
+            return
+
+        watchers = self._watchers.get((after.guild.id, after.id))
+        if not watchers:
+            return
+
+        before_breakdown: str | None = status_breakdown(
+            before.desktop_status, before.mobile_status, before.web_status
+        )
+        after_breakdown: str | None = status_breakdown(
+            after.desktop_status, after.mobile_status, after.web_status
+        )
+        from_text: str = (
+            f"\nfrom `{str(before.status).title()}`{f' ({before_breakdown})' if before_breakdown else ''}"
+        )
+        for user_id in list(watchers):  # may change while we're sending
+            try:
+                await (
+                    self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                ).send(
+                    f"Update from {escape_markdown(after.guild.name)}: "
+                    f"{after.mention}'s ({escape_markdown(after.display_name)}) status has changed to "
+                    f"`{str(after.status).title()}`{f' ({after_breakdown})' if after_breakdown else ''}"
+                    f"{from_text if before.status is not Status.offline else ''}"
+                )
+            except HTTPException:
+                continue
 
     @Cog.listener("on_presence_update")
     async def update_last_online(self, before: Member, after: Member) -> None:
-        document: PCDocument = await self.bot.get_user_document(after)
-        if (
+        going_offline = (
             before.status is not Status.offline and after.status is Status.offline
-        ) or after.status is not Status.offline:
-            await document.update_db(
-                {"$set": {"last_online": datetime.utcnow()}}  # type: ignore[deprecated]  # works fine
-            )  # probably some mongo managed solution
+        )
+        if not going_offline and after.status is Status.offline:
+            return
+
+        now = monotonic()
+        if (
+            not going_offline  # always catch the moment someone goes offline
+            and now - self._last_online_recorded_at.get(after.id, float("-inf"))
+            < self._last_online_interval
+        ):
+            return
+
+        self._last_online_recorded_at[after.id] = now
+        self._pending_last_online[after.id] = datetime.utcnow()  # type: ignore[deprecated]  # works fine
 
     @hybrid_group(name="watch", aliases=("w", "sw"), fallback="start")  # type: ignore [arg-type]  # d.py bad export
     @guild_only()
@@ -120,10 +275,14 @@ class StatusWatch(Cog):
     async def statuswatch(self, ctx: CustomContext, member: Member) -> None:
         """Watch a member's status. You'll receive updates in a DM."""
         assert ctx.guild is not None  # guaranteed by check
-        document = await ctx.bot.get_user_document(member)
+        document = await ctx.bot.get_user_document(member, fields=("watchers",))
         await document.update_db(
             {"$push": {"watchers": f"{ctx.guild.id}-{ctx.author.id}"}}
         )
+        self._add_watcher(ctx.guild.id, member.id, ctx.author.id)
+        await self.bot.invalidations.publish(
+            WATCHERS_INVALIDATION_TOPIC, str(member.id)
+        )
         await ctx.send(f"{member.mention} is now being watched.", ephemeral=True)
 
     @statuswatch.command(name="bulk")  # type: ignore [arg-type]  # d.py bad export
@@ -148,10 +307,16 @@ class StatusWatch(Cog):
     async def statuswatch_stop(self, ctx: CustomContext, member: Member) -> None:
         """Stop watching a member's status."""
         assert ctx.guild is not None  # guaranteed by check
-        document: PCDocument = await ctx.bot.get_user_document(member)
+        document: PCDocument = await ctx.bot.get_user_document(
+            member, fields=("watchers",)
+        )
         await document.update_db(
             {"$pull": {"watchers": f"{ctx.guild.id}-{ctx.author.id}"}}
         )
+        self._remove_watcher(ctx.guild.id, member.id, ctx.author.id)
+        await self.bot.invalidations.publish(
+            WATCHERS_INVALIDATION_TOPIC, str(member.id)
+        )
         await ctx.send(f"{member.mention} is no longer being watched.", ephemeral=True)
 
     @statuswatch.command(name="last_online", aliases=["last", "online"])  # type: ignore [arg-type]  # d.py bad export
@@ -160,11 +325,17 @@ class StatusWatch(Cog):
     async def statuswatch_last_online(self, ctx: CustomContext, member: Member) -> None:
         """Get the last time a member was online."""
         async with ctx.typing(ephemeral=True):
-            document: PCDocument = await ctx.bot.get_user_document(member)
-            last_online: datetime | None = await document.safe_get(
-                "last_online",
-                datetime.utcnow() if member.status is not Status.offline else None,  # type: ignore[deprecated]  # works fine
-            )
+            last_online: datetime | None = self._pending_last_online.get(
+                member.id
+            ) or self._flushing_last_online.get(member.id)
+            if last_online is None:
+                document: PCDocument = await ctx.bot.get_user_document(
+                    member, fields=("last_online",)
+                )
+                last_online = document.get(
+                    "last_online",
+                    datetime.utcnow() if member.status is not Status.offline else None,  # type: ignore[deprecated]  # works fine
+                )
             if member.status is not Status.offline:
                 await ctx.send(
                     embed=Embed(
@@ -10,6 +10,7 @@ from discord.ext.menus import ListPageSource, MenuPages
 
 from utils.bots.bot import CustomBot
 from utils.bots.context import CustomContext
+from utils.bots.messages import MessageEnvelope
 
 
 class MessageOfTheDay(Cog):
@@ -28,12 +29,13 @@ class MessageOfTheDay(Cog):
 
     @Cog.listener()
     async def on_after_invocation_nonblocking(self, ctx: CustomContext) -> None:
-        author_document = ctx["author_document"]
-        await author_document.update_db({"$inc": {"loyalty": 1}})
+        author_document = await ctx["author_document"]
+        # Buffered; the local copy of the document is incremented right away.
+        self.bot.increment_buffer.increment_document(author_document, {"loyalty": 1})
         # I'd like to see someone manage to cause an integer overflow with this.
-        total_invocations = int(await author_document.safe_subscript("loyalty"))
+        total_invocations = int(author_document["loyalty"])
 
-        already_seen_motds_raw = await author_document.safe_get("motds_seen", [])
+        already_seen_motds_raw = author_document.get("motds_seen", [])
         if not isinstance(already_seen_motds_raw, list):
             raise RuntimeError(
                 f"A non-list somehow snuck into `motds_seen` on {author_document}"
@@ -113,8 +115,14 @@ class MessageOfTheDay(Cog):
         # Since self._motd_current_message *should* be None if there isn't a current message, this works elegantly.
         # NOTE: since the MOTD channel SHOULD NOT be writable by the general public, we're treating it as privileged and not going to escape anything within it. Forkers beware.
 
-    @Cog.listener()
-    async def on_message(self, message: Message) -> None:
+    async def cog_load(self) -> None:
+        self.bot.add_message_handler(self.handle_message)
+
+    def cog_unload(self) -> None:  # type: ignore[override]  # discord exports wrong
+        self.bot.remove_message_handler(self.handle_message)
+
+    async def handle_message(self, envelope: MessageEnvelope) -> None:
+        message = envelope.message
         # Using the ID here instead of an object accounts for the incredibly narrow edge-case
         # where a new message is received before the on_ready hook finishes executing.
         if message.channel.id == self._motd_channel_id and (
@@ -89,6 +89,59 @@ class OwnerUtils(Cog):
         await ctx.send("Bringing up your menu...", ephemeral=True)
         await menu.start(ctx)
 
+    @command()
+    async def cachestats(self, ctx: CustomContext) -> None:
+        """Shows the hit, miss, and eviction counters of the in-memory document caches."""
+        embed = Embed(title="Document Caches")
+        for name, stats in ctx.bot.document_cache_stats.items():
+            embed.add_field(
+                name=name.title(),
+                value=(
+                    f"{stats['size']}/{stats['maxsize']} entries\n"
+                    f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%})\n"
+                    f"{stats['evictions']} evictions, {stats['expirations']} expirations"
+                ),
+                inline=False,
+            )
+        await ctx.send(embed=embed, ephemeral=True)
+
+    @command()
+    async def listenertimings(self, ctx: CustomContext) -> None:
+        """Shows the slowest listeners of the events that block command execution."""
+        embed = Embed(title="Slowest Listeners")
+        for name, timing in sorted(
+            ctx.bot.listener_timings.items(),
+            key=lambda item: item[1].mean,
+            reverse=True,
+        )[:10]:
+            embed.add_field(
+                name=name,
+                value=f"{timing.mean * 1000:.1f}ms mean, {timing.worst * 1000:.1f}ms worst over {timing.calls} calls",
+                inline=False,
+            )
+        await ctx.send(embed=embed, ephemeral=True)
+
+    @command()
+    async def commandrollups(self, ctx: CustomContext, hours: int = 1) -> None:
+        """Shows the most failing and slowest commands over the last few hours."""
+        hours = max(hours, 1)
+        rollups = await ctx.bot.command_rollups.summarize_recent(hours)
+        embed = Embed(title=f"Command Usage (Last {hours}h)")
+        for rollup in sorted(
+            rollups,
+            key=lambda rollup: (rollup.errors, rollup.percentile_ms(0.95)),
+            reverse=True,
+        )[:10]:
+            embed.add_field(
+                name=rollup.command,
+                value=(
+                    f"{rollup.invocations} invocations, {rollup.errors} errors ({rollup.error_rate:.1%})\n"
+                    f"{rollup.mean_latency_ms:.0f}ms mean, ≤{rollup.percentile_ms(0.95):.0f}ms p95"
+                ),
+                inline=False,
+            )
+        await ctx.send(embed=embed, ephemeral=True)
+
 
 async def setup(bot: CustomBot) -> None:
     await bot.add_cog(OwnerUtils(bot))
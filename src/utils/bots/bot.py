@@ -1,17 +1,24 @@
 import logging
 import sys
 import traceback
-from asyncio import Semaphore
-from collections import deque
+from asyncio import Task, create_task, wait
 from os import getcwd
 from os.path import splitext, join
+from time import perf_counter
 from typing import (
+    TYPE_CHECKING,
     Dict,
+    Iterable,
     Literal,
     Type,
+    Mapping,
     MutableMapping,
     Optional,
+    Sequence,
     Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
     TypeVar,
     cast,
     overload,
@@ -28,28 +35,82 @@ from discord import (
     Message,
 )
 from discord.ext.commands import Bot, Command, Context
+from pymongo.asynchronous.collection import AsyncCollection
 from pymongo.asynchronous.database import AsyncDatabase
 from discord.user import BaseUser, User
-from discord.utils import find
 from redis.asyncio import Redis
 
-from utils.database import PCDocument, PCInternalDocument
+from utils.cache import LRUCache, RedisDocumentCache, SingleFlight
+from utils.changes import (
+    DocumentChange,
+    DocumentChangeCallback,
+    DocumentChangeWatcher,
+)
+from utils.database import (
+    VERSION_FIELD,
+    WRITE_ORIGIN,
+    PCDocument,
+    PCInternalDocument,
+)
+from utils.invalidation import InvalidationBus
+from utils.ratelimit import MemoryCooldownBackend, RedisCooldownBackend
+from utils.rollups import CommandRollups
+from utils.writebehind import IncrementBuffer
 from .context import CustomContext
+from .messages import MessageEnvelope, MessageHandler, MessageHandlerRegistration
+
+if TYPE_CHECKING:
+    from utils.checks.blacklisted import BlacklistIndex
 
 logger: logging.Logger = logging.getLogger(__name__)
 
 ContextT = TypeVar("ContextT", bound="Context[Any]")
 
 
+class ListenerTiming:
+    """How long a listener for a blocking event has taken across all of its calls."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        self.worst = max(self.worst, elapsed)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls > 0 else 0.0
+
+
+def _covers(document: PCDocument, fields: frozenset[str] | None) -> bool:
+    """Checks if a document has fields (or all of its fields, if None) loaded."""
+    if document.loaded_fields is None:
+        return True
+    return fields is not None and fields <= document.loaded_fields
+
+
 # In the past, I used to maintain a version of the custom bot that used the AutoShardedMixin backend.
 # However, I decided to stop maintaining it in order to make typing easier.
 # Plus, I decided to start using emojis more, and emojis do not work consistently on AutoShardedBots: https://github.com/Rapptz/discord.py/discussions/8333
 class CustomBot(Bot):
+    # How long wait_for_dispatch waits on the listeners of an event before moving on without them, in seconds.
+    # Events that aren't listed are waited on for as long as they take.
+    # context_creation and before_invocation_blocking must never be listed: their listeners fill in the context that
+    # commands rely on, so moving on without them only trades a slow command for a broken one.
+    # Override with PEPPERCORD_DISPATCH_DEADLINE_<EVENT NAME>, e.g. PEPPERCORD_DISPATCH_DEADLINE_AFTER_INVOCATION_BLOCKING.
+    DEFAULT_DISPATCH_DEADLINES: dict[str, float] = {
+        "after_invocation_blocking": 5.0,
+    }
 
     @staticmethod
     async def before_invoke_handler(
         ctx: CustomContext, *args: Any, **kwargs: Any
     ) -> None:
+        # Before-invoke hooks only run once checks, cooldowns and argument conversion have passed, so this marks a command that really started.
+        ctx["invoked_at"] = perf_counter()
         await ctx.bot.wait_for_dispatch("before_invocation_blocking", ctx)
         ctx.bot.dispatch("before_invocation_nonblocking", ctx)
         # On custom contexts with interactions, the original kwargs can be discarded when a command is re-prepared
@@ -76,17 +137,85 @@ class CustomBot(Bot):
 
         self._config = config
 
+        document_cache_ttl = int(config.get("PEPPERCORD_DOCUMENT_CACHE_TTL", "300"))
+        self.document_cache = RedisDocumentCache(cdb, ttl=document_cache_ttl)
+
+        # Lets each process tell the others to drop what they've cached.
+        self.invalidations = InvalidationBus(cdb)
+
+        # Shared by every process, so that cooldowns hold no matter which one handles a command.
+        self.cooldowns = RedisCooldownBackend(
+            cdb,
+            fallback=MemoryCooldownBackend(
+                int(config.get("PEPPERCORD_COOLDOWN_FALLBACK_SIZE", "10000"))
+            ),
+        )
+
         self._custom_state: Dict[str, Any] = {}
 
-        self._context_cache: deque[CustomContext] = deque(maxlen=100)
-        self._context_semaphores: deque[tuple[int, Semaphore]] = deque(maxlen=100)
-        self._context_fetch_semaphore: Semaphore = Semaphore(1)
+        self._listener_timings: dict[str, ListenerTiming] = {}
+        # Listeners that overran their deadline; kept here so they aren't garbage collected while they finish
+        self._overrunning_listeners: set[Task[None]] = set()
 
-        self._user_doc_cache: deque[tuple[BaseUser | Member, PCDocument]] = deque(
-            maxlen=30
+        # Keyed by message/interaction ID
+        self._context_cache: LRUCache[int, CustomContext] = LRUCache(256, ttl=60)
+        self._context_loads: SingleFlight[int, CustomContext] = SingleFlight()
+
+        doc_cache_size = int(config.get("PEPPERCORD_DOCUMENT_LRU_SIZE", "1024"))
+        # Never longer than the Redis cache's TTL, so writes from other processes are seen at least as soon as through Redis.
+        doc_cache_ttl = min(
+            float(config.get("PEPPERCORD_DOCUMENT_LRU_TTL", "60")),
+            float(document_cache_ttl),
+        )
+        # Keyed by snowflake
+        self._user_doc_cache: LRUCache[int, PCDocument] = LRUCache(
+            doc_cache_size, ttl=doc_cache_ttl
+        )
+        self._guild_doc_cache: LRUCache[int, PCDocument] = LRUCache(
+            doc_cache_size, ttl=doc_cache_ttl
+        )
+        self.increment_buffer = IncrementBuffer(
+            interval=float(config.get("PEPPERCORD_WRITE_BEHIND_INTERVAL", "5")),
+            max_pending=int(config.get("PEPPERCORD_WRITE_BEHIND_MAX_PENDING", "1000")),
+            cache=self.document_cache,
+            on_flushed=self._on_increments_flushed,
         )
-        self._guild_doc_cache: deque[tuple[discord.Guild, PCDocument]] = deque(
-            maxlen=30
+        # Hourly usage of each command; written through the increment buffer.
+        self.command_rollups = CommandRollups(
+            ddb["command_rollups"], self.increment_buffer
+        )
+
+        # Keyed by (collection, *query); concurrent misses for the same document share one query
+        self._document_loads: SingleFlight[tuple[Any, ...], PCDocument] = SingleFlight()
+        # The fields wanted by every caller of an in-flight snowflake document load (None means the whole document), by (collection, snowflake)
+        self._wanted_fields: dict[tuple[str, int], frozenset[str] | None] = {}
+
+        # Optional; keeps cached documents in line with writes made by other processes.
+        self.change_watcher: DocumentChangeWatcher | None = (
+            DocumentChangeWatcher(
+                ddb,
+                # Command documents aren't cached anywhere, so nothing needs to hear about them changing.
+                ("guild", "user"),
+                self._on_document_change,
+                origin=WRITE_ORIGIN,
+                versions=self._cached_document_versions,
+                poll_interval=float(
+                    config.get("PEPPERCORD_CHANGE_POLL_INTERVAL", "30")
+                ),
+            )
+            if config.get("PEPPERCORD_WATCH_CHANGES")
+            else None
+        )
+        # By collection; the fields each callback depends on, and the callback.
+        self._document_change_callbacks: dict[
+            str, list[tuple[frozenset[str], DocumentChangeCallback]]
+        ] = {}
+
+        self._message_handlers: list[MessageHandlerRegistration] = []
+
+        # Keyed by message ID; only the keys matter.
+        self._deleted_messages: LRUCache[int, bool] = LRUCache(
+            int(config.get("PEPPERCORD_DELETED_MESSAGE_CACHE_SIZE", "4096"))
         )
 
         super().__init__(
@@ -96,10 +225,47 @@ class CustomBot(Bot):
 
         self.before_invoke(self.before_invoke_handler)
         self.after_invoke(self.after_invoke_handler)
+        # Alongside (not instead of) Bot.on_message, so that commands don't wait on message handlers or vice versa.
+        self.add_listener(self._run_message_pipeline, "on_message")
+
+    async def setup_hook(self) -> None:
+        self.increment_buffer.start()
+        self.invalidations.start()
+        if self.change_watcher is not None:
+            self.change_watcher.start()
+
+    async def on_graceful_shutdown(self) -> None:
+        await self.increment_buffer.close()
+        await self.invalidations.close()
+        if self.change_watcher is not None:
+            await self.change_watcher.close()
+
+    async def close(self) -> None:
+        await super().close()
+        # Commands that were still running during the graceful shutdown may have buffered increments since it closed the buffer.
+        await self.increment_buffer.flush()
+
+    async def on_raw_message_delete(
+        self, payload: discord.RawMessageDeleteEvent
+    ) -> None:
+        self._deleted_messages.put(payload.message_id, True)
+
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ) -> None:
+        for message_id in payload.message_ids:
+            self._deleted_messages.put(message_id, True)
+
+    def was_message_deleted(self, message_id: int) -> bool:
+        """Checks if a message has recently been deleted, according to the gateway. Messages deleted long enough ago are forgotten."""
+        return self._deleted_messages.peek(message_id) is not None
 
     # custom state
     @overload
-    def __getitem__(self, item: Literal["prefix_cache"]) -> dict[int, str]: ...
+    def __getitem__(self, item: Literal["prefix_cache"]) -> LRUCache[int, str]: ...
+
+    @overload
+    def __getitem__(self, item: Literal["blacklist"]) -> "BlacklistIndex": ...
 
     @overload
     def __getitem__(self, item: str) -> Any: ...
@@ -112,7 +278,12 @@ class CustomBot(Bot):
 
     @overload
     def __setitem__(
-        self, key: Literal["prefix_cache"], value: dict[int, str]
+        self, key: Literal["prefix_cache"], value: LRUCache[int, str]
+    ) -> None: ...
+
+    @overload
+    def __setitem__(
+        self, key: Literal["blacklist"], value: "BlacklistIndex"
     ) -> None: ...
 
     @overload
@@ -219,92 +390,382 @@ class CustomBot(Bot):
     def config(self) -> MutableMapping[str, str]:
         return self._config
 
+    def command_document_filter(
+        self, command: Command[Any, Any, Any]
+    ) -> dict[str, str | None]:
+        """Gets the query that matches a command's document."""
+
+        return {
+            "name": command.name,
+            "cog": getattr(
+                command, "cog_name", None
+            ),  # cog_name isn't on HybridAppCommand, even though it inherits from Command
+        }
+
     async def get_command_document(self, command: Command[Any, Any, Any]) -> PCDocument:
         """Gets a command's document from the database."""
 
-        return await PCDocument.get_document(
-            self.ddb["commands"],
-            {
-                "name": command.name,
-                "cog": getattr(
-                    command, "cog_name", None
-                ),  # cog_name isn't on HybridAppCommand, even though it inherits from Command
-            },
+        filter = self.command_document_filter(command)
+        return await self._document_loads.do(
+            ("commands", filter["name"], filter["cog"]),
+            lambda: PCDocument.get_document(self.ddb["commands"], filter),
         )
 
-    async def get_guild_document(self, model: discord.Guild) -> PCDocument:
-        """Gets a guild's document from the database."""
+    @property
+    def document_cache_stats(self) -> dict[str, dict[str, int | float]]:
+        """Counters for the in-process document caches."""
+        return {
+            "guild": self._guild_doc_cache.stats,
+            "user": self._user_doc_cache.stats,
+        }
+
+    async def _load_snowflake_document(
+        self,
+        collection_name: str,
+        cache: LRUCache[int, PCDocument],
+        snowflake: int,
+    ) -> PCDocument:
+        key = (collection_name, snowflake)
+        try:
+            # Something else (i.e. prefetch_guild_documents) may have cached it in the meantime; there must only be one.
+            document = cache.peek(snowflake)
+            if document is None:
+                document = await PCDocument.get_document(
+                    self.ddb[collection_name],
+                    {"_id": snowflake},
+                    cache=self.document_cache,
+                    fields=self._wanted_fields.get(key, frozenset()),
+                )
+            # Callers that joined this load while it was running may want more fields; load them for all of them at once.
+            while not _covers(
+                document, wanted := self._wanted_fields.get(key, frozenset())
+            ):
+                if wanted is None:
+                    await document.ensure_loaded()
+                else:
+                    await document.ensure_loaded(*wanted)
+            cache.put(snowflake, document)
+            return document
+        finally:
+            # Nothing can join between here and the load finishing, since there is no await in between.
+            self._wanted_fields.pop(key, None)
 
-        for other, document in self._guild_doc_cache:
-            if other == model:
-                return document
-        else:
-            document = await PCDocument.get_document(
-                self.ddb["guild"], {"_id": model.id}
+    async def _get_snowflake_document(
+        self,
+        collection_name: str,
+        cache: LRUCache[int, PCDocument],
+        snowflake: int,
+        fields: Iterable[str] | None,
+    ) -> PCDocument:
+        wanted = (
+            frozenset(field.split(".", 1)[0] for field in fields)
+            if fields is not None
+            else None
+        )
+        document = cache.get(snowflake)
+        if document is None:
+            # Keyed by snowflake alone, so that callers wanting different fields still share one load and one document.
+            key = (collection_name, snowflake)
+            already_wanted = self._wanted_fields.get(key, frozenset())
+            self._wanted_fields[key] = (
+                already_wanted | wanted
+                if already_wanted is not None and wanted is not None
+                else None
             )
-            self._guild_doc_cache.appendleft((model, document))
-            return document
+            document = await self._document_loads.do(
+                key,
+                lambda: self._load_snowflake_document(
+                    collection_name, cache, snowflake
+                ),
+            )
+        # A cached document may have been loaded with different fields than these.
+        if wanted is None:
+            await document.ensure_loaded()
+        else:
+            await document.ensure_loaded(*wanted)
+        return document
 
-    async def get_user_document(self, model: Member | BaseUser) -> PCDocument:
-        """Gets a user's document from the database."""
+    async def prefetch_guild_documents(
+        self, guild_ids: Iterable[int], *, batch_size: int = 500
+    ) -> AsyncIterator[int]:
+        """
+        Loads the documents of many guilds into the document caches with batched $in queries, instead of one query per guild.
+        Guilds that have no document are cached as new documents. Guilds that are already cached in-process are skipped.
+        Every document goes to Redis, but only as many as the in-process cache has room for are kept there too.
+        Yields how many documents each batch loaded.
+        """
+        collection = self.ddb["guild"]
+        to_load = [
+            guild_id
+            for guild_id in guild_ids
+            if self._guild_doc_cache.peek(guild_id) is None
+        ]
+
+        for start in range(0, len(to_load), batch_size):
+            batch = to_load[start : start + batch_size]
+            found: dict[int, PCDocument] = {}
+            async for internal_document in collection.find({"_id": {"$in": batch}}):
+                found[internal_document["_id"]] = internal_document.wrap(
+                    collection, {"_id": internal_document["_id"]}
+                )
 
-        for other, document in self._user_doc_cache:
-            if other == model:
-                return document
-        else:
-            document = await PCDocument.get_document(
-                self.ddb["user"], {"_id": model.id}
-            )
-            self._user_doc_cache.appendleft((model, document))
-            return document
+            loaded: list[PCDocument] = []
+            for guild_id in batch:
+                if self._guild_doc_cache.peek(guild_id) is not None:
+                    continue  # Loaded by something else in the meantime; that copy may be newer.
+                document = found.get(guild_id)
+                if document is None:
+                    document = PCDocument(collection, {"_id": guild_id}, _id=guild_id)
+                document._cache = self.document_cache
+                # Filling the in-process cache past its size would only evict what was just prefetched.
+                if len(self._guild_doc_cache) < self._guild_doc_cache.maxsize:
+                    self._guild_doc_cache.put(guild_id, document)
+                loaded.append(document)
+            await self.document_cache.store_many(loaded)
+            yield len(loaded)
+
+    async def get_guild_document(
+        self, model: discord.Guild, *, fields: Iterable[str] | None = None
+    ) -> PCDocument:
+        """
+        Gets a guild's document from the database.
+        If fields are passed, the document may only have those (top-level) fields loaded.
+        """
+        return await self._get_snowflake_document(
+            "guild", self._guild_doc_cache, model.id, fields
+        )
 
-    async def get_context(
-        self, origin: Message | Interaction, *, cls: Type[ContextT] = CustomContext  # type: ignore[assignment]
-    ) -> ContextT:
-        if cls is CustomContext:
-            async with self._context_fetch_semaphore:
-                # d.py calls get_context multiple times simultaneously for each context
-                # To avoid running the DB hooks more than once, this code ensures that only one context exists per message/interaction
+    async def invalidate_guild_documents(self, *guild_ids: int) -> None:
+        """Drops guilds' documents from every cache, so that the next read goes to the database."""
+        for guild_id in guild_ids:
+            self._guild_doc_cache.pop(guild_id)
+        await self.document_cache.invalidate_many(
+            self.ddb["guild"], [{"_id": guild_id} for guild_id in guild_ids]
+        )
 
-                maybe_semaphore_tuple: tuple[int, Semaphore] | None = find(
-                    lambda sema_tuple: sema_tuple[0] == origin.id,
-                    reversed(self._context_semaphores),
-                )
+    async def invalidate_user_documents(self, *user_ids: int) -> None:
+        """Drops users' documents from every cache, so that the next read goes to the database."""
+        for user_id in user_ids:
+            self._user_doc_cache.pop(user_id)
+        await self.document_cache.invalidate_many(
+            self.ddb["user"], [{"_id": user_id} for user_id in user_ids]
+        )
 
-                processing_semaphore: Semaphore | None = (
-                    maybe_semaphore_tuple[-1]
-                    if maybe_semaphore_tuple is not None
-                    else None
-                )
+    def _document_lru(self, collection_name: str) -> LRUCache[int, PCDocument] | None:
+        return {"guild": self._guild_doc_cache, "user": self._user_doc_cache}.get(
+            collection_name
+        )
 
-                if processing_semaphore is None:
-                    processing_semaphore = Semaphore(1)
-                    self._context_semaphores.append((origin.id, processing_semaphore))
-            async with processing_semaphore:
-                existing: CustomContext | None = find(
-                    lambda ctx: ctx.message.id == origin.id,
-                    reversed(self._context_cache),
-                )
+    def _cached_document_versions(self, collection_name: str) -> dict[int, int | None]:
+        lru = self._document_lru(collection_name)
+        if lru is None:
+            return {}
+        return {
+            document_id: document.snapshot.get(VERSION_FIELD)
+            for document_id, document in lru.items()
+        }
 
-                if existing is not None:
-                    return cast(
-                        ContextT, existing
-                    )  # the existing context will already have had its hooks run, send it!
-                else:
-                    result = await super().get_context(origin, cls=CustomContext)
-                    await self.wait_for_dispatch("context_creation", result)
-                    self.dispatch("message_context", result)
-                    # new! kind of useless because there is no way to check if it is a new message, but could be useful for analytics? maybe?
-                    self._context_cache.append(result)
+    def _on_increments_flushed(
+        self,
+        collection: AsyncCollection[PCInternalDocument],
+        filter: Any,
+        acknowledged: Sequence[PCDocument],
+    ) -> None:
+        lru = self._document_lru(collection.name)
+        if lru is None or not isinstance(filter, Mapping) or "_id" not in filter:
+            return
+        cached = lru.peek(filter["_id"])
+        if cached is not None and not any(
+            cached is document for document in acknowledged
+        ):
+            # This copy doesn't show the increments that were just written.
+            lru.pop(filter["_id"])
+
+    async def _on_document_change(self, change: DocumentChange) -> None:
+        lru = self._document_lru(change.collection)
+        if lru is not None:
+            cached = lru.peek(change.document_id)
+            if cached is not None:
+                cached_version = cached.snapshot.get(VERSION_FIELD)
+                if (
+                    change.version is None
+                    or cached_version is None
+                    or cached_version < change.version
+                ):
+                    # Our copy is older than the change (or it can't be told), so it goes.
+                    lru.pop(change.document_id)
+                    await self.document_cache.invalidate(
+                        self.ddb[change.collection], {"_id": change.document_id}
+                    )
+        # Derived caches (prefixes, the blacklist, custom commands) are kept by cogs, which subscribe to the fields they're built from.
+        for fields, callback in list(
+            self._document_change_callbacks.get(change.collection, ())
+        ):
+            if not change.touches(*fields):
+                continue
+            try:
+                await callback(change)
+            except Exception:
+                logger.exception(f"Failed to handle {change} in {callback!r}!")
+
+    def subscribe_document_changes(
+        self,
+        collection_name: str,
+        fields: Iterable[str],
+        callback: DocumentChangeCallback,
+    ) -> None:
+        """
+        Calls callback with every change that another process makes to a document in collection_name and that could have affected any of fields.
+        Callbacks are awaited one at a time, in the order changes happened. Nothing is delivered unless PEPPERCORD_WATCH_CHANGES is set.
+        """
+        self._document_change_callbacks.setdefault(collection_name, []).append(
+            (frozenset(fields), callback)
+        )
 
+    def unsubscribe_document_changes(
+        self, collection_name: str, callback: DocumentChangeCallback
+    ) -> None:
+        callbacks = self._document_change_callbacks.get(collection_name)
+        if callbacks is not None:
+            callbacks[:] = [
+                (fields, subscribed)
+                for fields, subscribed in callbacks
+                if subscribed != callback
+            ]
+
+    async def apply_written_user_fields(
+        self, fields_by_user: Mapping[int, Mapping[str, Any]]
+    ) -> None:
+        """
+        Brings user documents held in memory up to date with fields that were $set on the database around them (i.e. by a bulk write),
+        and drops them from Redis. The copies in memory can't replace the ones in Redis, since they don't show what other processes wrote since they were loaded.
+        """
+        for user_id, fields in fields_by_user.items():
+            document = self._user_doc_cache.peek(user_id)
+            if document is not None:
+                document.apply_written_fields(fields)
+        await self.document_cache.invalidate_many(
+            self.ddb["user"], [{"_id": user_id} for user_id in fields_by_user]
+        )
+
+    async def get_user_document(
+        self, model: Member | BaseUser, *, fields: Iterable[str] | None = None
+    ) -> PCDocument:
+        """
+        Gets a user's document from the database.
+        If fields are passed, the document may only have those (top-level) fields loaded.
+        """
+        return await self._get_snowflake_document(
+            "user", self._user_doc_cache, model.id, fields
+        )
+
+    async def get_context(
+        self, origin: Message | Interaction, *, cls: Type[ContextT] = CustomContext  # type: ignore[assignment]
+    ) -> ContextT:
+        if cls is CustomContext:
+            # d.py calls get_context multiple times simultaneously for each context
+            # To avoid running the DB hooks more than once, this code ensures that only one context exists per message/interaction
+            # Contexts for different messages/interactions are built fully in parallel.
+
+            existing: CustomContext | None = self._context_cache.get(origin.id)
+            if existing is not None:
                 return cast(
-                    ContextT, result
-                )  # mypy bug? this is already the correct type without a cast
+                    ContextT, existing
+                )  # the existing context will already have had its hooks run, send it!
+
+            return cast(
+                ContextT,
+                await self._context_loads.do(
+                    origin.id, lambda: self._create_context(origin)
+                ),
+            )
         else:
             return await super().get_context(
                 origin, cls=cls
             )  # all of our fancy magic only works on customcontext
 
+    async def _create_context(self, origin: Message | Interaction) -> CustomContext:
+        result = await super().get_context(origin, cls=CustomContext)
+        await self.wait_for_dispatch("context_creation", result)
+        self._context_cache.put(origin.id, result)
+        self.dispatch("message_context", result)
+        # new! kind of useless because there is no way to check if it is a new message, but could be useful for analytics? maybe?
+        return result
+
+    def dispatch_deadline(self, event_name: str) -> float | None:
+        """Gets how long wait_for_dispatch will wait on the listeners of an event, or None if there's no limit."""
+        configured = self._config.get(
+            f"PEPPERCORD_DISPATCH_DEADLINE_{event_name.upper()}"
+        )
+        if configured is not None:
+            return float(configured)
+        return self.DEFAULT_DISPATCH_DEADLINES.get(event_name)
+
+    @property
+    def listener_timings(self) -> dict[str, ListenerTiming]:
+        """Timings of every listener that has been run by wait_for_dispatch, keyed by event and listener name."""
+        return self._listener_timings
+
+    async def _run_timed_listener(
+        self,
+        event_method: str,
+        listener: Callable[..., Coroutine[Any, Any, Any]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        started = perf_counter()
+        try:
+            await self._run_event(listener, event_method, *args, **kwargs)
+        finally:
+            elapsed = perf_counter() - started
+            name = (
+                f"{event_method}: {getattr(listener, '__qualname__', repr(listener))}"
+            )
+            self._listener_timings.setdefault(name, ListenerTiming()).record(elapsed)
+            logger.debug(f"{name} took {elapsed * 1000:.1f}ms")
+
+    def add_message_handler(
+        self,
+        handler: MessageHandler,
+        *,
+        humans_only: bool = False,
+        guilds_only: bool = False,
+        commands: bool = True,
+        predicate: Callable[[Message], bool] | None = None,
+    ) -> None:
+        """
+        Registers a handler to be given every incoming message, in the order handlers were added.
+        Prefer this over an on_message listener; handlers share one context and guild document per message.
+        humans_only and guilds_only skip messages from bots and messages outside of guilds.
+        If commands is False, messages that invoke a command are skipped.
+        predicate is checked before anything is loaded; use it to cheaply skip messages that are irrelevant to the handler.
+        """
+        self._message_handlers.append(
+            MessageHandlerRegistration(
+                handler,
+                humans_only=humans_only,
+                guilds_only=guilds_only,
+                commands=commands,
+                predicate=predicate,
+            )
+        )
+
+    def remove_message_handler(self, handler: MessageHandler) -> None:
+        self._message_handlers = [
+            registration
+            for registration in self._message_handlers
+            if registration.handler != handler
+        ]
+
+    async def _run_message_pipeline(self, message: Message) -> None:
+        envelope = MessageEnvelope(self, message)
+        for registration in list(self._message_handlers):
+            try:
+                if await registration.accepts(envelope):
+                    await registration.handler(envelope)
+            except Exception:
+                await self.on_error(f"message handler {registration.name}", message)
+
     # Gripe: hooks into internals too much. Should be retired.
     async def wait_for_dispatch(
         self, event_name: str, *args: Any, **kwargs: Any
@@ -312,12 +773,36 @@ class CustomBot(Bot):
         """
         Dispatch a d.py client event, and wait for the listeners to finish.
         Also includes the bot listeners "extra_events"
+        The listeners run concurrently. If they don't all finish before the event's deadline (see dispatch_deadline),
+        this stops waiting and leaves the stragglers running in the background.
         """
 
-        await self._super___wait_for_dispatch(event_name, *args, **kwargs)
         ev = "on_" + event_name
-        for event in self.extra_events.get(ev, []):
-            await super()._schedule_event(event, ev, *args, **kwargs)
+        tasks: list[Task[None]] = [
+            create_task(
+                self._super___wait_for_dispatch(event_name, *args, **kwargs),
+                name=f"{ev}: {type(self).__qualname__}.{ev}",
+            )
+        ]
+        for listener in self.extra_events.get(ev, []):
+            tasks.append(
+                create_task(
+                    self._run_timed_listener(ev, listener, *args, **kwargs),
+                    name=f"{ev}: {getattr(listener, '__qualname__', repr(listener))}",
+                )
+            )
+
+        deadline = self.dispatch_deadline(event_name)
+        _, pending = await wait(tasks, timeout=deadline)
+
+        if pending:
+            logger.warning(
+                f"{len(pending)} {'listener' if len(pending) == 1 else 'listeners'} overran the {deadline}s deadline: "
+                + ", ".join(task.get_name() for task in pending)
+            )
+            for task in pending:
+                self._overrunning_listeners.add(task)
+                task.add_done_callback(self._overrunning_listeners.discard)
 
     # The methods below this comment were originally a part of the ClientMixin that was applied to both the AutoSharded and regular bots.
 
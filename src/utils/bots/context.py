@@ -4,14 +4,13 @@ from typing import Dict, Any, Literal, cast, TYPE_CHECKING, Coroutine, overload
 from discord import (
     Message,
     HTTPException,
-    NotFound,
     User,
     VoiceProtocol,
     WebhookMessage,
 )
 from discord.ext.commands import Context
 
-from utils.database import PCDocument
+from utils.database import LazyDocument
 
 from ..audio import *
 
@@ -37,7 +36,7 @@ class _DefaultSendHandler(SendHandler):
                 # Before we reply to the message, we need to check if the message still exists.
                 # If the user quickly deletes the message or we jank it with purge, we need to
                 # avoid hitting a reference.
-                # Also, this is stupid and slow. The whole bot is. Oh well.
+                # The bot keeps track of recently deleted messages from the gateway, so this doesn't need a round trip.
                 if (
                     self.ctx.guild is not None
                     and not self.ctx.channel.permissions_for(
@@ -47,14 +46,11 @@ class _DefaultSendHandler(SendHandler):
                     # If we don't have read_message_history, we need to bail so we don't accidentally cause an error.
                     pass
                     # I would return here, but this method has a stupid structure and this isn't a submethod
-                else:
-                    og_message = self.ctx.message
-                    try:
-                        await self.ctx.channel.fetch_message(og_message.id)
-                    except NotFound:
-                        pass
-                    else:
-                        kwargs["reference"] = self.ctx.message
+                elif not self.ctx.bot.was_message_deleted(self.ctx.message.id):
+                    # If it gets deleted before the reply lands anyway, Discord sends the reply as a normal message instead of rejecting it.
+                    kwargs["reference"] = self.ctx.message.to_reference(
+                        fail_if_not_exists=False
+                    )
             message = await self.ctx.send_bare(*args, **kwargs)
         else:
             try:
@@ -84,13 +80,13 @@ class CustomContext(Context["CustomBot"]):
     # Special cases for keys this bot uses often
     # Other keys are forbidden
     @overload
-    def __getitem__(self, item: Literal["guild_document"]) -> PCDocument: ...
+    def __getitem__(self, item: Literal["guild_document"]) -> LazyDocument: ...
 
     @overload
-    def __getitem__(self, item: Literal["author_document"]) -> PCDocument: ...
+    def __getitem__(self, item: Literal["author_document"]) -> LazyDocument: ...
 
     @overload
-    def __getitem__(self, item: Literal["command_document"]) -> PCDocument: ...
+    def __getitem__(self, item: Literal["command_document"]) -> LazyDocument | None: ...
 
     @overload
     def __getitem__(self, item: Literal["response"]) -> Message: ...
@@ -98,6 +94,9 @@ class CustomContext(Context["CustomBot"]):
     @overload
     def __getitem__(self, item: Literal["original_kwargs"]) -> dict[str, Any]: ...
 
+    @overload
+    def __getitem__(self, item: Literal["invoked_at"]) -> float: ...
+
     @overload
     def __getitem__(self, item: str) -> Any: ...
 
@@ -110,17 +109,17 @@ class CustomContext(Context["CustomBot"]):
     # Other keys are forbidden
     @overload
     def __setitem__(
-        self, key: Literal["guild_document"], value: PCDocument
+        self, key: Literal["guild_document"], value: LazyDocument
     ) -> None: ...
 
     @overload
     def __setitem__(
-        self, key: Literal["author_document"], value: PCDocument
+        self, key: Literal["author_document"], value: LazyDocument
     ) -> None: ...
 
     @overload
     def __setitem__(
-        self, key: Literal["command_document"], value: PCDocument
+        self, key: Literal["command_document"], value: LazyDocument | None
     ) -> None: ...
 
     @overload
@@ -131,6 +130,9 @@ class CustomContext(Context["CustomBot"]):
         self, key: Literal["original_kwargs"], value: dict[str, Any]
     ) -> None: ...
 
+    @overload
+    def __setitem__(self, key: Literal["invoked_at"], value: float) -> None: ...
+
     @overload
     def __setitem__(self, key: str, value: Any) -> None: ...
 
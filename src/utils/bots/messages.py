@@ -0,0 +1,89 @@
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Coroutine
+
+from discord import Message
+
+from utils.database import LazyDocument, PCDocument
+
+if TYPE_CHECKING:
+    from .bot import CustomBot
+    from .context import CustomContext
+
+
+class MessageEnvelope:
+    """
+    An incoming message, classified once and shared between every message handler.
+    Anything expensive (the context, the guild document) is only computed if a handler asks for it, and then only once.
+    """
+
+    def __init__(self, bot: "CustomBot", message: Message) -> None:
+        self.bot = bot
+        self.message = message
+
+        self.from_bot: bool = message.author.bot
+        self.in_guild: bool = message.guild is not None
+
+        self._context: "CustomContext | None" = None
+        self._guild_document: LazyDocument | None = (
+            LazyDocument(partial(bot.get_guild_document, message.guild))
+            if message.guild is not None
+            else None
+        )
+
+    async def context(self) -> "CustomContext":
+        """Gets the context for this message."""
+        if self._context is None:
+            # get_context is already single-flight per message, so racing handlers still only build one.
+            self._context = await self.bot.get_context(self.message)
+        return self._context
+
+    async def guild_document(self) -> PCDocument:
+        """Gets the document of the guild this message was sent in. Only valid if in_guild."""
+        if self._guild_document is None:
+            raise RuntimeError("This message was not sent in a guild!")
+        return await self._guild_document
+
+    async def is_command(self) -> bool:
+        """Checks if this message invokes a (non-custom) command."""
+        return (await self.context()).valid
+
+
+MessageHandler = Callable[[MessageEnvelope], Coroutine[Any, Any, None]]
+
+
+class MessageHandlerRegistration:
+    """A message handler, along with which messages it should be given."""
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        *,
+        humans_only: bool = False,
+        guilds_only: bool = False,
+        commands: bool = True,
+        predicate: Callable[[Message], bool] | None = None,
+    ) -> None:
+        self.handler = handler
+        self.humans_only = humans_only
+        self.guilds_only = guilds_only
+        self.commands = commands
+        self.predicate = predicate
+
+    @property
+    def name(self) -> str:
+        return getattr(self.handler, "__qualname__", repr(self.handler))
+
+    async def accepts(self, envelope: MessageEnvelope) -> bool:
+        # Cheapest checks first; checking for a command needs the context.
+        if self.humans_only and envelope.from_bot:
+            return False
+        if self.guilds_only and not envelope.in_guild:
+            return False
+        if self.predicate is not None and not self.predicate(envelope.message):
+            return False
+        if not self.commands and await envelope.is_command():
+            return False
+        return True
+
+
+__all__ = ("MessageEnvelope", "MessageHandler", "MessageHandlerRegistration")
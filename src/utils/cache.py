@@ -0,0 +1,274 @@
+import logging
+from asyncio import CancelledError, Future, current_task, get_running_loop, shield
+from collections import OrderedDict
+from time import monotonic
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    TypeVar,
+)
+
+from bson import json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS, JSONOptions
+from pymongo.asynchronous.collection import AsyncCollection
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+if TYPE_CHECKING:
+    from utils.database import PCDocument, PCInternalDocument
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K")
+V = TypeVar("V")
+HK = TypeVar("HK", bound=Hashable)
+
+# Mongo hands us naive datetimes, so documents coming back out of Redis need to match.
+_JSON_OPTIONS: JSONOptions = CANONICAL_JSON_OPTIONS.with_options(tz_aware=False)
+
+
+def filter_key(filter: Any) -> str:
+    """Gets a stable string representation of a query filter, suitable for use as a cache key."""
+    return json_util.dumps(filter, sort_keys=True, json_options=_JSON_OPTIONS)
+
+
+class LRUCache(Generic[K, V]):
+    """
+    A bounded, keyed least-recently-used cache with an optional time-to-live.
+    Keeps hit, miss, and eviction counters so that it can be sized from real traffic.
+    """
+
+    def __init__(self, maxsize: int, *, ttl: float | None = None) -> None:
+        if maxsize < 1:
+            raise ValueError("An LRUCache must be able to hold at least one item!")
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: K) -> V | None:
+        """Gets an item from the cache, marking it as recently used. Returns None on a miss."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = entry
+        if self.ttl is not None and monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: K) -> V | None:
+        """Gets an item from the cache without touching its recency or the counters."""
+        entry = self._data.get(key)
+        if entry is None or (
+            self.ttl is not None and monotonic() - entry[0] > self.ttl
+        ):
+            return None
+        return entry[1]
+
+    def put(self, key: K, value: V) -> None:
+        """Puts an item into the cache, evicting the least recently used item if the cache is full."""
+        self._data[key] = (monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        """Removes an item from the cache, returning it if it was present."""
+        entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def items(self) -> list[tuple[K, V]]:
+        """Gets every unexpired item in the cache, without touching their recency or the counters."""
+        now = monotonic()
+        return [
+            (key, value)
+            for key, (stored_at, value) in self._data.items()
+            if self.ttl is None or now - stored_at <= self.ttl
+        ]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: object) -> bool:
+        entry = self._data.get(key)  # type: ignore[arg-type]  # any other key is simply not present
+        return entry is not None and (
+            self.ttl is None or monotonic() - entry[0] <= self.ttl
+        )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class SingleFlight(Generic[HK, V]):
+    """
+    Deduplicates concurrent loads of the same key.
+    Callers that arrive while a load for their key is in flight await that load instead of starting their own.
+    Nothing is kept once a load finishes; pair this with a cache.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[HK, Future[V]] = {}
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._in_flight
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: HK, loader: Callable[[], Awaitable[V]]) -> V:
+        while (existing := self._in_flight.get(key)) is not None:
+            try:
+                # Shielded so that one impatient caller can't cancel the load for everybody else.
+                return await shield(existing)
+            except CancelledError:
+                task = current_task()
+                if existing.cancelled() and (task is None or task.cancelling() == 0):
+                    # The caller that owned the load was cancelled, not us. Try again.
+                    continue
+                raise
+
+        future: Future[V] = get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await loader()
+        except CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark as retrieved; there may be no other waiters
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+
+class RedisDocumentCache:
+    """
+    A read-through/write-through tier for PCDocuments, stored in Redis.
+    Redis being unavailable is never fatal; every failure is treated as a cache miss.
+    """
+
+    def __init__(
+        self, redis: Redis, *, ttl: int = 300, namespace: str = "peppercord:document"
+    ) -> None:
+        self._redis = redis
+        self._ttl = ttl
+        self._namespace = namespace
+
+    def key(self, collection: AsyncCollection[PCInternalDocument], filter: Any) -> str:
+        return f"{self._namespace}:{collection.full_name}:{filter_key(filter)}"
+
+    async def load(
+        self, collection: AsyncCollection[PCInternalDocument], filter: Any
+    ) -> PCDocument | None:
+        """Gets a document from the cache, or None if it isn't cached."""
+        from utils.database import PCDocument  # circular
+
+        try:
+            raw = await self._redis.get(self.key(collection, filter))
+        except RedisError as e:
+            logger.warning(f"Failed to read document from the cache: {e}")
+            return None
+
+        if raw is None:
+            return None
+
+        document = PCDocument(
+            collection, filter, **json_util.loads(raw, json_options=_JSON_OPTIONS)
+        )
+        document._cache = self
+        return document
+
+    async def store(self, document: PCDocument) -> None:
+        """Writes a document to the cache, refreshing its TTL. Partially loaded documents are never cached."""
+        if document.is_partial:
+            return
+        try:
+            await self._redis.set(
+                self.key(document._collection, document._filter),
+                json_util.dumps(dict(document.snapshot), json_options=_JSON_OPTIONS),
+                ex=self._ttl,
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to write document to the cache: {e}")
+
+    async def store_many(self, documents: Iterable[PCDocument]) -> None:
+        """Writes several documents to the cache in one round trip. Partially loaded documents are skipped."""
+        try:
+            async with self._redis.pipeline(transaction=False) as pipeline:
+                for document in documents:
+                    if document.is_partial:
+                        continue
+                    pipeline.set(
+                        self.key(document._collection, document._filter),
+                        json_util.dumps(
+                            dict(document.snapshot), json_options=_JSON_OPTIONS
+                        ),
+                        ex=self._ttl,
+                    )
+                await pipeline.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to write documents to the cache: {e}")
+
+    async def invalidate(
+        self, collection: AsyncCollection[PCInternalDocument], filter: Any
+    ) -> None:
+        """Drops a document from the cache."""
+        try:
+            await self._redis.delete(self.key(collection, filter))
+        except RedisError as e:
+            logger.warning(f"Failed to invalidate document in the cache: {e}")
+
+    async def invalidate_many(
+        self, collection: AsyncCollection[PCInternalDocument], filters: Iterable[Any]
+    ) -> None:
+        """Drops several documents from the cache in one round trip."""
+        keys = [self.key(collection, filter) for filter in filters]
+        if not keys:
+            return
+        try:
+            await self._redis.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Failed to invalidate documents in the cache: {e}")
+
+
+__all__ = ("LRUCache", "RedisDocumentCache", "SingleFlight", "filter_key")
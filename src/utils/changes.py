@@ -0,0 +1,216 @@
+import logging
+import re
+from asyncio import Task, create_task, sleep
+from typing import Any, Awaitable, Callable, Iterable, Mapping
+
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from utils.database import VERSION_FIELD, WRITER_FIELD, PCInternalDocument
+
+logger = logging.getLogger(__name__)
+
+# Returned by servers that can't open change streams, i.e. standalone servers.
+_CHANGE_STREAMS_UNSUPPORTED = {40573}
+
+
+class DocumentChange:
+    """A document that was changed (by any process)."""
+
+    def __init__(
+        self,
+        collection: str,
+        document_id: Any,
+        *,
+        version: int | None = None,
+        fields: frozenset[str] | None = None,
+    ) -> None:
+        self.collection = collection
+        self.document_id = document_id
+        # The document's version after the change, if known.
+        self.version = version
+        # The top-level fields that changed, or None if that isn't known (i.e. the document was replaced or deleted).
+        self.fields = fields
+
+    def touches(self, *fields: str) -> bool:
+        """Checks if the change could have affected any of fields."""
+        return self.fields is None or not self.fields.isdisjoint(fields)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.collection}, {self.document_id!r}, version={self.version!r}, fields={self.fields!r})"
+
+
+DocumentChangeCallback = Callable[[DocumentChange], Awaitable[None]]
+
+
+def _change_pipeline(
+    collections: Iterable[str], origin: str | None
+) -> list[Mapping[str, Any]]:
+    pipeline: list[Mapping[str, Any]] = [
+        {"$match": {"ns.coll": {"$in": list(collections)}}},
+        # Only what's needed to identify the change is sent, not the documents themselves.
+        {
+            "$project": {
+                "ns": True,
+                "documentKey": True,
+                "operationType": True,
+                "version": {
+                    "$ifNull": [
+                        f"$updateDescription.updatedFields.{VERSION_FIELD}",
+                        f"$fullDocument.{VERSION_FIELD}",
+                    ]
+                },
+                "updatedFields": {
+                    "$map": {
+                        "input": {
+                            "$objectToArray": {
+                                "$ifNull": ["$updateDescription.updatedFields", {}]
+                            }
+                        },
+                        "in": "$$this.k",
+                    }
+                },
+                "removedFields": "$updateDescription.removedFields",
+                "writer": {
+                    "$ifNull": [
+                        f"$updateDescription.updatedFields.{WRITER_FIELD}",
+                        f"$fullDocument.{WRITER_FIELD}",
+                    ]
+                },
+            }
+        },
+    ]
+    if origin is not None:
+        # Our own writes are filtered out by the server, so they never cross the network. Deletes have no writer and are kept.
+        pipeline.append(
+            {"$match": {"writer": {"$not": {"$regex": f"^{re.escape(origin)}:"}}}}
+        )
+    return pipeline
+
+
+class DocumentChangeWatcher:
+    """
+    Watches collections for changes made by any process, and passes each one to callback.
+    Changes written by versioned() with origin as their writer (i.e. this process's own) are skipped.
+    Uses a change stream when the server supports them. Otherwise (i.e. on a standalone server), falls back to polling
+    the versions of the documents that versions reports as cached, every poll_interval seconds.
+    Polling can't tell who made a change, so it relies on versions being kept up to date with this process's own writes.
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase[PCInternalDocument],
+        collections: Iterable[str],
+        callback: DocumentChangeCallback,
+        *,
+        origin: str | None = None,
+        versions: Callable[[str], Mapping[Any, int | None]] | None = None,
+        poll_interval: float = 30.0,
+    ) -> None:
+        self._database = database
+        self._collections = tuple(collections)
+        self._callback = callback
+        self._origin = origin
+        self._versions = versions
+        self._poll_interval = poll_interval
+        self._watcher: Task[None] | None = None
+
+    async def _deliver(self, change: DocumentChange) -> None:
+        try:
+            await self._callback(change)
+        except Exception:
+            logger.exception(f"Failed to handle {change}!")
+
+    async def _watch(self) -> None:
+        resume_token: Mapping[str, Any] | None = None
+        backoff = 1.0
+        while True:
+            try:
+                async with await self._database.watch(
+                    _change_pipeline(self._collections, self._origin),
+                    resume_after=resume_token,
+                ) as stream:
+                    logger.info(
+                        f"Watching {', '.join(self._collections)} with a change stream."
+                    )
+                    backoff = 1.0
+                    async for event in stream:
+                        resume_token = stream.resume_token
+                        await self._deliver(self._change_from_event(event))
+            except OperationFailure as e:
+                if e.code in _CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info(
+                        f"Change streams aren't supported by this server, polling every {self._poll_interval}s instead."
+                    )
+                    await self._poll()
+                    return
+                logger.warning(f"Change stream failed, retrying in {backoff}s: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Change stream failed, retrying in {backoff}s: {e}")
+            await sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    @staticmethod
+    def _change_from_event(event: Mapping[str, Any]) -> DocumentChange:
+        fields: frozenset[str] | None = None
+        if event["operationType"] == "update":
+            fields = frozenset(
+                path.split(".", 1)[0]
+                for path in (
+                    *event.get("updatedFields", []),
+                    *(event.get("removedFields") or []),
+                )
+            )
+        return DocumentChange(
+            event["ns"]["coll"],
+            event.get("documentKey", {}).get("_id"),
+            version=event.get("version"),
+            fields=fields,
+        )
+
+    async def _poll(self) -> None:
+        if self._versions is None:
+            logger.warning("There is nothing to poll; changes won't be watched.")
+            return
+        while True:
+            await sleep(self._poll_interval)
+            for collection in self._collections:
+                cached_versions = dict(self._versions(collection))
+                if not cached_versions:
+                    continue
+                try:
+                    current_versions = {
+                        document["_id"]: document.get(VERSION_FIELD)
+                        async for document in self._database[collection].find(
+                            {"_id": {"$in": list(cached_versions)}},
+                            {VERSION_FIELD: True},
+                        )
+                    }
+                except PyMongoError as e:
+                    logger.warning(f"Failed to poll {collection} for changes: {e}")
+                    continue
+                for document_id, cached_version in cached_versions.items():
+                    if document_id not in current_versions:
+                        if cached_version is not None:
+                            # It existed when it was cached, so it has been deleted since.
+                            await self._deliver(DocumentChange(collection, document_id))
+                    elif current_versions[document_id] != cached_version:
+                        await self._deliver(
+                            DocumentChange(
+                                collection,
+                                document_id,
+                                version=current_versions[document_id],
+                            )
+                        )
+
+    def start(self) -> None:
+        if self._watcher is None or self._watcher.done():
+            self._watcher = create_task(self._watch(), name="document_change_watcher")
+
+    async def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+
+__all__ = ("DocumentChange", "DocumentChangeCallback", "DocumentChangeWatcher")
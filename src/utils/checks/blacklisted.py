@@ -13,23 +13,49 @@ class EBlacklisted(commands.CheckFailure):
     pass
 
 
-async def is_blacklisted(ctx: Context[Any]) -> bool:
+class BlacklistIndex:
+    """
+    The IDs of every blacklisted guild and user, kept in memory.
+    Blacklisted entities are rare, so this is small; checking it never needs a document.
+    """
+
+    def __init__(
+        self, guilds: set[int] | None = None, users: set[int] | None = None
+    ) -> None:
+        self.guilds: set[int] = guilds if guilds is not None else set()
+        self.users: set[int] = users if users is not None else set()
+
+    def set_guild(self, guild_id: int, blacklisted: bool) -> None:
+        if blacklisted:
+            self.guilds.add(guild_id)
+        else:
+            self.guilds.discard(guild_id)
+
+    def set_user(self, user_id: int, blacklisted: bool) -> None:
+        if blacklisted:
+            self.users.add(user_id)
+        else:
+            self.users.discard(user_id)
+
+    def is_blacklisted(self, *, guild_id: int | None, user_id: int) -> bool:
+        return (guild_id is not None and guild_id in self.guilds) or (
+            user_id in self.users
+        )
+
+
+def is_blacklisted(ctx: Context[Any]) -> bool:
     """Checks if a context is blacklisted from executing commands."""
-    if isinstance(ctx, CustomContext):
-        return (
-            ctx.guild is not None
-            and bool(
-                await ctx["guild_document"].safe_get("blacklisted", False)
-            )  # TODO: NamedDict compliance
-            or bool(
-                await ctx["author_document"].safe_get("blacklisted", False)
-            )  # TODO: NamedDict compliance
+    if isinstance(ctx, CustomContext) and "blacklist" in ctx.bot:
+        return ctx.bot["blacklist"].is_blacklisted(
+            guild_id=ctx.guild.id if ctx.guild is not None else None,
+            user_id=ctx.author.id,
         )
     else:
         return False
 
 
 __all__: list[str] = [
+    "BlacklistIndex",
     "EBlacklisted",
     "is_blacklisted",
 ]
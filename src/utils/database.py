@@ -1,11 +1,29 @@
-from asyncio import Lock
+from asyncio import Lock, Task, create_task, shield
 from collections.abc import KeysView, ValuesView, ItemsView
+from itertools import count
 import logging
-from typing import Any, Iterator, Mapping, Never, Sequence, TypeVar
+from types import MappingProxyType
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+    TypeVar,
+)
+from typing import TYPE_CHECKING
+from uuid import uuid4
 import warnings
 
-from aiorwlock import RWLock
+from pymongo import ReturnDocument
 from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import DuplicateKeyError
+
+if TYPE_CHECKING:
+    from utils.cache import RedisDocumentCache
 
 
 logger = logging.getLogger(__name__)
@@ -29,37 +47,347 @@ class PCInternalDocument(UPSTREAM_DICT_TYPE):
         return PCDocument(collection, filter, **self)
 
 
-class PCDocument(UPSTREAM_DICT_TYPE):
+# Bumped by every write, so that a writer can tell if a document changed since it was read.
+VERSION_FIELD = "_v"
+# Set by every write to "<origin>:<counter>", so that a watcher can tell which process made a change.
+# The counter makes the value differ on every write, which keeps it among the fields a change stream reports as updated.
+WRITER_FIELD = "_w"
+# Identifies this process's writes in WRITER_FIELD.
+WRITE_ORIGIN = uuid4().hex
+_write_counter = count()
+
+
+class DocumentConflictError(Exception):
+    """Raised when a document was changed by someone else between being read and being written, and the change couldn't be reconciled."""
+
+
+def versioned(update: Mapping[str, Any]) -> dict[str, Any]:
+    """Gets a copy of an update (made of $-operators) that also bumps the document's version and records this process as its writer."""
+    new_update = dict(update)
+    new_update["$inc"] = {**new_update.get("$inc", {}), VERSION_FIELD: 1}
+    new_update["$set"] = {
+        **new_update.get("$set", {}),
+        WRITER_FIELD: f"{WRITE_ORIGIN}:{next(_write_counter)}",
+    }
+    return new_update
+
+
+# Fields that are maintained by versioned() rather than by the document's contents.
+_BOOKKEEPING_FIELDS = frozenset(("_id", VERSION_FIELD, WRITER_FIELD))
+
+
+def diff_documents(
+    old: Mapping[str, Any], new: Mapping[str, Any], *, prefix: str = ""
+) -> dict[str, Any]:
+    """
+    Gets the smallest update (of $set & $unset, with dotted paths) that turns old into new.
+    Embedded documents are compared field-by-field rather than replaced as a whole.
+    _id, the version field, and the writer field are never included.
+    """
+    set_fields: dict[str, Any] = {}
+    unset_fields: dict[str, Any] = {}
+
+    def walk(
+        old_level: Mapping[str, Any], new_level: Mapping[str, Any], path: str
+    ) -> None:
+        for key, new_value in new_level.items():
+            if not path and key in _BOOKKEEPING_FIELDS:
+                continue
+            full_path = f"{path}{key}"
+            if key not in old_level:
+                set_fields[full_path] = new_value
+                continue
+            old_value = old_level[key]
+            if (
+                isinstance(old_value, Mapping)
+                and isinstance(new_value, Mapping)
+                # Keys that can't be part of a dotted path force the whole embedded document to be set.
+                and all(
+                    "." not in child and not child.startswith("$")
+                    for child in (*old_value.keys(), *new_value.keys())
+                )
+            ):
+                walk(old_value, new_value, f"{full_path}.")
+            elif old_value != new_value or type(old_value) is not type(new_value):
+                set_fields[full_path] = new_value
+        for key in old_level.keys() - new_level.keys():
+            if not path and key in _BOOKKEEPING_FIELDS:
+                continue
+            unset_fields[f"{path}{key}"] = ""
+
+    walk(old, new, prefix)
+
+    update: dict[str, Any] = {}
+    if set_fields:
+        update["$set"] = set_fields
+    if unset_fields:
+        update["$unset"] = unset_fields
+    return update
+
+
+class FieldNotLoadedError(LookupError):
+    """
+    Raised when reading a field that wasn't loaded into a partially loaded PCDocument. Use PCDocument.fetch or ensure_loaded.
+    Deliberately not a KeyError, so that it is never mistaken for the field not existing.
+    """
+
+
+def _top_level_fields(paths: Iterable[str]) -> frozenset[str]:
+    return frozenset(path.split(".", 1)[0] for path in paths)
+
+
+def _touched_fields(update: Mapping[str, Any]) -> frozenset[str]:
+    """Gets the top-level fields that an update (made of $-operators) can change."""
+    paths: set[str] = set()
+    for operator, spec in update.items():
+        if isinstance(spec, Mapping):
+            paths.update(spec.keys())
+            if operator == "$rename":
+                paths.update(spec.values())
+    return _top_level_fields(paths)
+
+
+def _with_increments(
+    state: Mapping[str, Any], increments: Mapping[str, int | float]
+) -> dict[str, Any]:
+    """Gets a copy of a document's state with $inc-style deltas (with dotted paths) applied."""
+    new_state = dict(state)
+    for path, delta in increments.items():
+        *parents, leaf = path.split(".")
+        container = new_state
+        for part in parents:
+            # Copy each level on the way down so the original is never mutated.
+            child = container.get(part)
+            child = dict(child) if isinstance(child, Mapping) else {}
+            container[part] = child
+            container = child
+        container[leaf] = container.get(leaf, 0) + delta
+    return new_state
+
+
+def _with_next_version(state: Mapping[str, Any]) -> dict[str, Any]:
+    """Gets a copy of a document's state with the version a single versioned write would leave it at."""
+    # $inc starts a missing version at 0, whether the write created the document or it simply predates versioning.
+    return {**state, VERSION_FIELD: (state.get(VERSION_FIELD) or 0) + 1}
+
+
+class PCDocument(Mapping[str, Any]):
     """
     Represents a single MongoDB document.
     The existence of a PCDocument does not guarantee a document in MongoDB exists that tracks the PCDocument.
     Update document with an upsert must be called.
+
+    Reads are served synchronously from an immutable snapshot of the document.
+    Writes never modify the snapshot in place; once a write completes, the new state of the document is swapped in as a whole.
+
+    A document can be partially loaded, with only some of its top-level fields (see get_document).
+    Reading a field that wasn't loaded (including with get, in, or by enumerating the document) raises FieldNotLoadedError,
+    rather than answering as if the field didn't exist; fetch and ensure_loaded load missing fields on demand.
     """
 
     def __init__(
         self,
         collection: AsyncCollection[PCInternalDocument],
         filter: Any,
-        **kwargs: Any
+        **kwargs: Any,
     ):
         self._collection = collection
         self._filter = filter
-        self._write_in_flight_lock = RWLock()
-        super().__init__(**kwargs)
+        self._write_lock = Lock()  # writers still need to serialize among themselves
+        self._cache: RedisDocumentCache | None = None
+        self._snapshot: Mapping[str, Any] = MappingProxyType(kwargs)
+        self._unwritten_increments: dict[str, int | float] = {}
+        # Top-level fields that have been loaded from the database, or None if the whole document has been.
+        self._loaded_fields: frozenset[str] | None = None
+
+    @property
+    def loaded_fields(self) -> frozenset[str] | None:
+        """The top-level fields that have been loaded, or None if the whole document has been."""
+        return self._loaded_fields
+
+    @property
+    def is_partial(self) -> bool:
+        return self._loaded_fields is not None
+
+    def _check_loaded(self, key: str) -> None:
+        if self._loaded_fields is not None and key not in self._loaded_fields:
+            raise FieldNotLoadedError(key)
+
+    def _check_complete(self) -> None:
+        if self._loaded_fields is not None:
+            raise FieldNotLoadedError(
+                f"Only {', '.join(sorted(self._loaded_fields))} are loaded; the document can't be enumerated."
+            )
+
+    def _visible_increments(self) -> Mapping[str, int | float]:
+        # Unwritten increments to fields that aren't loaded are applied once (and if) those fields are.
+        if self._loaded_fields is None:
+            return self._unwritten_increments
+        return {
+            path: delta
+            for path, delta in self._unwritten_increments.items()
+            if path.split(".", 1)[0] in self._loaded_fields
+        }
+
+    @property
+    def snapshot(self) -> Mapping[str, Any]:
+        """The current, read-only state of the document. It will never change; later writes swap in a new snapshot."""
+        return self._snapshot
+
+    def _swap_snapshot(self, new_state: Mapping[str, Any]) -> None:
+        self._snapshot = MappingProxyType(dict(new_state))
+
+    def _swap_snapshot_from_database(self, new_state: Mapping[str, Any]) -> None:
+        # Increments that haven't been written yet won't be in what the database sent back.
+        increments = self._visible_increments()
+        self._swap_snapshot(
+            _with_increments(new_state, increments) if increments else new_state
+        )
+
+    def apply_increments_locally(self, increments: Mapping[str, int | float]) -> None:
+        """
+        Applies $inc-style deltas (with dotted paths) to the snapshot without writing them to the database.
+        This is for writes that are made on the document's behalf elsewhere, like with an IncrementBuffer.
+        The deltas are kept on top of anything read back from the database until acknowledge_increments is called.
+        """
+        for path, delta in increments.items():
+            self._unwritten_increments[path] = (
+                self._unwritten_increments.get(path, 0) + delta
+            )
+        if self._loaded_fields is not None:
+            increments = {
+                path: delta
+                for path, delta in increments.items()
+                if path.split(".", 1)[0] in self._loaded_fields
+            }
+        self._swap_snapshot(_with_increments(self._snapshot, increments))
+
+    def acknowledge_increments(self, increments: Mapping[str, int | float]) -> None:
+        """
+        Marks deltas that were applied with apply_increments_locally as written to the database,
+        and advances the version to match the (single, versioned) write that carried them.
+        """
+        for path, delta in increments.items():
+            remaining = self._unwritten_increments.get(path, 0) - delta
+            if remaining:
+                self._unwritten_increments[path] = remaining
+            else:
+                self._unwritten_increments.pop(path, None)
+        self._swap_snapshot(_with_next_version(self._snapshot))
+
+    def apply_written_fields(self, fields: Mapping[str, Any]) -> None:
+        """
+        Applies top-level fields that were $set on the database on this document's behalf elsewhere (i.e. in a bulk write),
+        and advances the version to match that write. Fields that aren't loaded are left alone.
+        """
+        new_state = dict(self._snapshot)
+        for key, value in fields.items():
+            if self._loaded_fields is None or key in self._loaded_fields:
+                new_state[key] = value
+        self._swap_snapshot(_with_next_version(new_state))
 
     @classmethod
     async def get_document(
-        cls, collection: AsyncCollection[PCInternalDocument], filter: Any
+        cls,
+        collection: AsyncCollection[PCInternalDocument],
+        filter: Any,
+        *,
+        cache: RedisDocumentCache | None = None,
+        fields: Iterable[str] | None = None,
     ) -> PCDocument:
-        """Gets a document from the database with a query, or returns a new one with the content of the query."""
-
-        maybe_internal_doc = await collection.find_one(filter)
+        """
+        Gets a document from the database with a query, or returns a new one with the content of the query.
+        If a cache is passed, it is read before the database and kept up to date by writes to the returned document.
+        If fields are passed, only those top-level fields are loaded from the database (a cached document is always complete).
+        """
 
+        if cache is not None:
+            maybe_cached_doc = await cache.load(collection, filter)
+            if maybe_cached_doc is not None:
+                return maybe_cached_doc
+
+        loaded_fields = (
+            _top_level_fields(fields) | {"_id", VERSION_FIELD}
+            if fields is not None
+            else None
+        )
+        maybe_internal_doc = await collection.find_one(
+            filter,
+            (
+                {field: True for field in loaded_fields}
+                if loaded_fields is not None
+                else None
+            ),
+        )
+
+        document: PCDocument
         if maybe_internal_doc is not None:
-            return maybe_internal_doc.wrap(collection, filter)
+            document = maybe_internal_doc.wrap(collection, filter)
+            document._loaded_fields = loaded_fields
+        else:
+            # Document doesn't exist, we will be making it a-new
+            # There is nothing else to load, so it is complete.
+            document = cls(collection, filter, **filter)
+
+        if cache is not None:
+            # Caching documents that don't exist yet is intentional; most users never get one.
+            document._cache = cache
+            await cache.store(document)
+
+        return document
 
-        # Document doesn't exist, we will be making it a-new
-        return cls(collection, filter, **filter)
+    async def ensure_loaded(self, *fields: str) -> None:
+        """
+        Loads top-level fields that haven't been loaded yet from the database. Fields that are already loaded are left alone.
+        With no fields, loads the whole document.
+        """
+        loaded = self._loaded_fields
+        if loaded is None:
+            return
+        wanted = _top_level_fields(fields)
+        if wanted and wanted <= loaded:
+            return
+
+        async with self._write_lock:
+            # Something else may have loaded them while we waited.
+            loaded = self._loaded_fields
+            if loaded is None:
+                return
+            missing = wanted - loaded
+
+            if not wanted:
+                new_int_doc = await self._collection.find_one(self._filter)
+                self._loaded_fields = None
+                self._swap_snapshot_from_database(
+                    new_int_doc if new_int_doc is not None else self._filter
+                )
+            elif missing:
+                new_int_doc = await self._collection.find_one(
+                    self._filter, {field: True for field in missing}
+                )
+                merged = dict(self._snapshot)
+                for field in missing:
+                    if new_int_doc is not None and field in new_int_doc:
+                        merged[field] = new_int_doc[field]
+                    else:
+                        merged.pop(field, None)
+                self._loaded_fields = loaded | missing
+                increments = {
+                    path: delta
+                    for path, delta in self._unwritten_increments.items()
+                    if path.split(".", 1)[0] in missing
+                }
+                self._swap_snapshot(
+                    _with_increments(merged, increments) if increments else merged
+                )
+
+        if not wanted and self._cache is not None:
+            await self._cache.store(self)
+
+    async def fetch(self, key: str, default: Any = None) -> Any:
+        """Like get, but loads the field first if this document is partial and doesn't have it."""
+        await self.ensure_loaded(key)
+        return self._snapshot.get(key, default)
 
     @classmethod
     async def find_document(
@@ -79,216 +407,310 @@ class PCDocument(UPSTREAM_DICT_TYPE):
         self,
         update: Mapping[str, Any],
         *,
-        array_filters: Sequence[Mapping[str, Any]] | None = None
+        array_filters: Sequence[Mapping[str, Any]] | None = None,
+        transactional: bool = False,
     ) -> None:
-        """Performs an update query on the database with the document."""
-
-        async with self._write_in_flight_lock.writer_lock:
-            async with self._collection.database.client.start_session() as session:
-                async with await session.start_transaction():
-                    await self._collection.update_one(
-                        self._filter, update, array_filters=array_filters, upsert=True
-                    )
+        """
+        Performs an update query on the database with the document.
+        By default, the upsert and the reload of the document happen in a single round trip with find_one_and_update.
+        Pass transactional=True to instead run the update inside a session & transaction.
+        On a partially loaded document, only the loaded fields and the fields the update touches are read back.
+        """
 
-            super().clear()
+        async with self._write_lock:
+            fields_after = (
+                self._loaded_fields | _touched_fields(update)
+                if self._loaded_fields is not None
+                else None
+            )
+            projection = (
+                {field: True for field in fields_after}
+                if fields_after is not None
+                else None
+            )
 
-            new_int_doc = await self._collection.find_one(self._filter)
+            update = versioned(update)
+            new_int_doc: PCInternalDocument | None
+            if transactional:
+                async with self._collection.database.client.start_session() as session:
+                    async with await session.start_transaction():
+                        await self._collection.update_one(
+                            self._filter,
+                            update,
+                            array_filters=array_filters,
+                            upsert=True,
+                            session=session,
+                        )
+                        new_int_doc = await self._collection.find_one(
+                            self._filter, projection, session=session
+                        )
+            else:
+                # Single-document writes are already atomic; no need for a transaction here.
+                new_int_doc = await self._collection.find_one_and_update(
+                    self._filter,
+                    update,
+                    array_filters=array_filters,
+                    upsert=True,
+                    projection=projection,
+                    return_document=ReturnDocument.AFTER,
+                )
 
             if new_int_doc is None:
                 raise RuntimeError("Document didn't exist, right after upserting it!")
 
-            super().update(new_int_doc)
+            self._loaded_fields = fields_after
+            self._swap_snapshot_from_database(new_int_doc)
+
+        if self._cache is not None:
+            if self._loaded_fields is None:
+                await self._cache.store(self)
+            else:
+                # Only complete documents are cached, and we don't have this one complete to replace the stale one with.
+                await self._cache.invalidate(self._collection, self._filter)
+
+    async def replace_db(
+        self,
+        replacement: Mapping[str, Any] | None = None,
+        *,
+        on_conflict: (
+            Callable[[Mapping[str, Any], Mapping[str, Any]], Mapping[str, Any] | None]
+            | None
+        ) = None,
+        retries: int = 3,
+    ) -> None:
+        """
+        Makes the document on the database look like replacement (or this document, if there is none).
+        Only the fields that differ from this document's snapshot are written, with $set & $unset.
+
+        The write only goes through if nobody else has written to the document since it was loaded.
+        If somebody has, the document is reloaded and on_conflict is called with its new state and replacement.
+        on_conflict returns what to replace the document with now, and the write is retried (up to retries times);
+        if it returns None, or there is no on_conflict, DocumentConflictError is raised.
+        """
+        if replacement is None:
+            replacement = self._snapshot
+
+        for _ in range(retries + 1):
+            async with self._write_lock:
+                update = diff_documents(self._snapshot, replacement)
+                if not update:
+                    return  # Nothing to write.
+
+                version = self._snapshot.get(VERSION_FIELD)
+                fields_after = (
+                    self._loaded_fields | _touched_fields(update)
+                    if self._loaded_fields is not None
+                    else None
+                )
+                try:
+                    new_int_doc = await self._collection.find_one_and_update(
+                        {
+                            **self._filter,
+                            VERSION_FIELD: (
+                                version if version is not None else {"$exists": False}
+                            ),
+                        },
+                        versioned(update),
+                        # A document that has a version definitely exists already, so don't make a second one if the version doesn't match.
+                        upsert=version is None,
+                        projection=(
+                            {field: True for field in fields_after}
+                            if fields_after is not None
+                            else None
+                        ),
+                        return_document=ReturnDocument.AFTER,
+                    )
+                except DuplicateKeyError:
+                    # Lost a race to create the document.
+                    new_int_doc = None
+
+                if new_int_doc is not None:
+                    self._loaded_fields = fields_after
+                    self._swap_snapshot_from_database(new_int_doc)
+                    break
+
+                # Somebody else got there first. Catch up to them before deciding what to do.
+                current_int_doc = await self._collection.find_one(
+                    self._filter,
+                    (
+                        {field: True for field in self._loaded_fields}
+                        if self._loaded_fields is not None
+                        else None
+                    ),
+                )
+                self._swap_snapshot_from_database(
+                    current_int_doc if current_int_doc is not None else self._filter
+                )
+
+            rebased = (
+                on_conflict(self._snapshot, replacement)
+                if on_conflict is not None
+                else None
+            )
+            if rebased is None:
+                raise DocumentConflictError(
+                    f"{self!r} was changed while it was being replaced."
+                )
+            replacement = rebased
+        else:
+            raise DocumentConflictError(
+                f"{self!r} kept changing while it was being replaced; gave up after {retries} retries."
+            )
 
-    async def replace_db(self) -> None:
-        """Replaces the document on the database with this document."""
-        async with self._write_in_flight_lock.writer_lock:
-            await self._collection.replace_one(self._filter, dict(self), upsert=True)
+        if self._cache is not None:
+            if self._loaded_fields is None:
+                await self._cache.store(self)
+            else:
+                await self._cache.invalidate(self._collection, self._filter)
 
     async def delete_db(self) -> None:
         """Deletes the document from the database."""
-        async with self._write_in_flight_lock.writer_lock:
+        async with self._write_lock:
             async with self._collection.database.client.start_session() as session:
                 async with await session.start_transaction():
-                    await self._collection.delete_one(self._filter)
-                    super().clear()
-                    super().update(self._filter)
+                    await self._collection.delete_one(self._filter, session=session)
+            self._loaded_fields = None
+            self._swap_snapshot(self._filter)
+
+        if self._cache is not None:
+            await self._cache.invalidate(self._collection, self._filter)
 
     # State retrievers
+    # All of these are plain lookups against the current snapshot, so none of them need to wait on a write.
+    # On a partial document, iteration and containment only cover the loaded fields.
 
-    async def safe_subscript(self, key: str) -> Any:
-        """
-        Gets an item from the PCDocument while guaranteeing no write is in flight.
-        This should be used over the __getitem__ method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().__getitem__(key)
+    def __getitem__(self, key: str) -> Any:
+        self._check_loaded(key)
+        return self._snapshot[key]
+
+    def __iter__(self) -> Iterator[str]:
+        self._check_complete()
+        return iter(self._snapshot)
+
+    def __len__(self) -> int:
+        self._check_complete()
+        return len(self._snapshot)
+
+    def __contains__(self, key: object) -> bool:
+        if isinstance(key, str):
+            self._check_loaded(key)
+        return key in self._snapshot
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._collection.name}, {self._filter!r}, {dict(self._snapshot)!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # default is only for fields the document doesn't have, not ones that weren't loaded.
+        self._check_loaded(key)
+        return self._snapshot.get(key, default)
+
+    def keys(self) -> KeysView[str]:
+        self._check_complete()
+        return self._snapshot.keys()
+
+    def values(self) -> ValuesView[Any]:
+        self._check_complete()
+        return self._snapshot.values()
+
+    def items(self) -> ItemsView[str, Any]:
+        self._check_complete()
+        return self._snapshot.items()
+
+    # Async retrievers
+    # These are left over from when reads had to take a reader lock.
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #__getitem__! Migrate to #safe_subscript to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #__getitem__."
     )
-    def __getitem__(self, key: str) -> Any:
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().__getitem__(key)
+    async def safe_subscript(self, key: str) -> Any:
+        return self[key]
 
+    @warnings.deprecated(
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #get."
+    )
     async def safe_get(self, key: str, default: Any = None) -> Any:
-        """
-        Gets an item from the PCDocument with optional default while guaranteeing no write is in flight.
-        This should be used over the get method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().get(key, default)
+        return self.get(key, default)
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #get! Migrate to #safe_get to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #keys."
     )
-    def get(self, key: str, default: Any = None) -> Any:
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().get(key, default)
-
     async def safe_keys(self) -> KeysView[str]:
-        """
-        Gets keys view from the PCDocument while guaranteeing no write is in flight.
-        This should be used over the keys method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().keys()
+        return self.keys()
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #keys! Migrate to #safe_keys to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #values."
     )
-    def keys(self) -> KeysView[str]:  # type: ignore[override]  # private
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().keys()
-
     async def safe_values(self) -> ValuesView[Any]:
-        """
-        Gets values view from the PCDocument while guaranteeing no write is in flight.
-        This should be used over the values method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().values()
+        return self.values()
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #values! Migrate to #safe_values to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #items."
     )
-    def values(self) -> ValuesView[Any]:  # type: ignore[override]  # private
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().values()
-
     async def safe_items(self) -> ItemsView[str, Any]:
-        """
-        Gets items view from the PCDocument while guaranteeing no write is in flight.
-        This should be used over the items method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().items()
+        return self.items()
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #items! Migrate to #safe_items to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #__contains__."
     )
-    def items(self) -> ItemsView[str, Any]:  # type: ignore[override]  # private
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().items()
-
     async def safe_contains(self, key: str) -> bool:
-        """
-        Checks if key exists in the PCDocument while guaranteeing no write is in flight.
-        This should be used over the __contains__ method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().__contains__(key)
+        return key in self
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #__contains__! Migrate to #safe_contains to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #__len__."
     )
-    def __contains__(self, key: object) -> bool:
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().__contains__(key)
-
     async def safe_len(self) -> int:
-        """
-        Gets the length of the PCDocument while guaranteeing no write is in flight.
-        This should be used over the __len__ method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            return super().__len__()
+        return len(self)
 
     @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #__len__! Migrate to #safe_len to avoid runtime errors!"
+        "Reads from a PCDocument no longer need to be awaited! Migrate to #__iter__."
     )
-    def __len__(self) -> int:
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().__len__()
-
     async def safe_iter(self) -> Iterator[str]:
-        """
-        Gets an iterator over keys from the PCDocument while guaranteeing no write is in flight.
-        This should be used over the __iter__ method to prevent race conditions when a write may be in flight.
-        """
-        async with self._write_in_flight_lock.reader_lock:
-            # Return a list to avoid iterator invalidation issues
-            return iter(list(super().keys()))
-
-    @warnings.deprecated(
-        "Tried to read a PCDocument from a sync context with #__iter__! Migrate to #safe_iter to avoid runtime errors!"
-    )
-    def __iter__(self) -> Iterator[str]:
-        if self._write_in_flight_lock.writer_lock.locked:
-            raise RuntimeError(
-                "Tried to read a PCDocument that is currently being updated!"
-            )
-        return super().__iter__()
-
-    # State setters
+        return iter(self)
 
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def __setitem__(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
-
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def __delitem__(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
-
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def update(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
-
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def setdefault(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
-
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def pop(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
-
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def popitem(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
-
-    @warnings.deprecated("This method is not supported on this subclass.")
-    def clear(self, *args: Any, **kwargs: Any) -> Never:
-        raise NotImplementedError("Use #update_db!")
 
+class LazyDocument:
+    """
+    A PCDocument that isn't loaded until something first awaits it.
+    Every await after the first (including ones made while the first is still loading) gets the same document.
+    """
 
-__all__ = ("PCDocument", "PCInternalDocument")
+    def __init__(self, loader: Callable[[], Awaitable[PCDocument]]) -> None:
+        self._loader = loader
+        self._task: Task[PCDocument] | None = None
+
+    async def _load(self) -> PCDocument:
+        return await self._loader()
+
+    @property
+    def loaded(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    def peek(self) -> PCDocument | None:
+        """Gets the document if it has already been loaded, without loading it."""
+        if self._task is None or not self._task.done() or self._task.cancelled():
+            return None
+        return self._task.result() if self._task.exception() is None else None
+
+    def load(self) -> Task[PCDocument]:
+        """Starts loading the document if it isn't already loading."""
+        if self._task is None or self._task.cancelled():
+            self._task = create_task(self._load())
+        return self._task
+
+    def __await__(self) -> Generator[Any, None, PCDocument]:
+        # Shielded so that one impatient awaiter can't cancel the load for everybody else.
+        return shield(self.load()).__await__()
+
+
+__all__ = (
+    "DocumentConflictError",
+    "FieldNotLoadedError",
+    "LazyDocument",
+    "PCDocument",
+    "PCInternalDocument",
+    "VERSION_FIELD",
+    "WRITE_ORIGIN",
+    "WRITER_FIELD",
+    "diff_documents",
+    "versioned",
+)
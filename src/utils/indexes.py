@@ -0,0 +1,153 @@
+import logging
+from datetime import datetime
+from typing import Any, Mapping
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure
+
+from utils.database import PCInternalDocument
+
+logger = logging.getLogger(__name__)
+
+# Dropping an index that (or whose collection) doesn't exist fails with one of these.
+_INDEX_NOT_FOUND = {26, 27}
+
+# Every index PepperCord needs, by collection.
+# Creating an index that already exists with the same options does nothing, so this is safe to apply on every startup.
+INDEX_MANIFEST: dict[str, list[IndexModel]] = {
+    "commands": [
+        # Command documents (and their stats) are looked up by name and cog, and there must only ever be one of each.
+        IndexModel(
+            [("name", ASCENDING), ("cog", ASCENDING)],
+            name="command_name_cog",
+            unique=True,
+        ),
+    ],
+    "user": [
+        # Polled every minute by the Minecraft status checker. Most documents don't have it.
+        # Only the address is indexed; indexing whole servers would index (and keep rewriting) each one's last status.
+        IndexModel(
+            [("minecraft_servers.address", ASCENDING)],
+            name="minecraft_servers_address_sparse",
+            sparse=True,
+        ),
+        # Loaded by the blacklist on startup. Only the blacklisted few are indexed.
+        IndexModel(
+            [("blacklisted", ASCENDING)],
+            name="blacklisted_partial",
+            partialFilterExpression={"blacklisted": True},
+        ),
+        # Loaded by StatusWatch on startup.
+        IndexModel(
+            [("watchers", ASCENDING)],
+            name="watchers_sparse",
+            sparse=True,
+        ),
+    ],
+    "command_rollups": [
+        # Each hour's rollup document is upserted by command and cog, and summaries read a range of hours.
+        IndexModel(
+            [("hour", ASCENDING), ("command", ASCENDING), ("cog", ASCENDING)],
+            name="hour_command_cog",
+            unique=True,
+        ),
+    ],
+    "guild": [
+        IndexModel(
+            [("minecraft_servers.address", ASCENDING)],
+            name="minecraft_servers_address_sparse",
+            sparse=True,
+        ),
+        IndexModel(
+            [("blacklisted", ASCENDING)],
+            name="blacklisted_partial",
+            partialFilterExpression={"blacklisted": True},
+        ),
+    ],
+}
+
+# Indexes that used to be in the manifest, and are dropped wherever they still exist.
+RETIRED_INDEXES: dict[str, list[str]] = {
+    # Indexed every element of minecraft_servers, including each server's last status.
+    "user": ["minecraft_servers_sparse"],
+    "guild": ["minecraft_servers_sparse"],
+}
+
+# Queries that run often (or on large collections) and must never scan a whole collection.
+HOT_QUERIES: list[tuple[str, Mapping[str, Any]]] = [
+    ("commands", {"name": "help", "cog": None}),
+    ("user", {"minecraft_servers.address": {"$exists": True}}),
+    ("guild", {"minecraft_servers.address": {"$exists": True}}),
+    ("user", {"blacklisted": True}),
+    ("guild", {"blacklisted": True}),
+    ("user", {"watchers": {"$exists": True}}),
+    ("command_rollups", {"hour": {"$gte": datetime(2000, 1, 1)}}),
+]
+
+
+async def ensure_indexes(database: AsyncDatabase[PCInternalDocument]) -> None:
+    """Creates every index in the manifest that doesn't already exist, and drops retired ones."""
+    for collection_name, index_names in RETIRED_INDEXES.items():
+        for index_name in index_names:
+            try:
+                await database[collection_name].drop_index(index_name)
+            except OperationFailure as e:
+                if e.code not in _INDEX_NOT_FOUND:
+                    logger.error(
+                        f"Failed to drop retired index {index_name} on {collection_name}: {e}"
+                    )
+            else:
+                logger.info(f"Dropped retired index {index_name} on {collection_name}.")
+
+    for collection_name, indexes in INDEX_MANIFEST.items():
+        try:
+            created = await database[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # i.e. an index with the same name but different options, or duplicates that violate a unique index
+            logger.error(f"Failed to create indexes on {collection_name}: {e}")
+        else:
+            logger.debug(f"Ensured indexes on {collection_name}: {', '.join(created)}")
+
+
+def _plan_stages(plan: Any) -> list[str]:
+    if isinstance(plan, Mapping):
+        stages = [plan["stage"]] if "stage" in plan else []
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+        return stages
+    elif isinstance(plan, list):
+        return [stage for item in plan for stage in _plan_stages(item)]
+    else:
+        return []
+
+
+async def warn_on_collection_scans(database: AsyncDatabase[PCInternalDocument]) -> int:
+    """
+    Explains each hot query, and logs a warning for each one that would scan its whole collection.
+    Returns how many did.
+    """
+    scans = 0
+    for collection_name, query in HOT_QUERIES:
+        try:
+            explanation = await database[collection_name].find(query).explain()
+        except OperationFailure as e:
+            logger.warning(f"Failed to explain {query} on {collection_name}: {e}")
+            continue
+        if "COLLSCAN" in _plan_stages(
+            explanation.get("queryPlanner", {}).get("winningPlan", {})
+        ):
+            scans += 1
+            logger.warning(
+                f"The query {query} on {collection_name} is scanning the whole collection! Is an index missing?"
+            )
+    return scans
+
+
+__all__ = (
+    "HOT_QUERIES",
+    "INDEX_MANIFEST",
+    "RETIRED_INDEXES",
+    "ensure_indexes",
+    "warn_on_collection_scans",
+)
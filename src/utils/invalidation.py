@@ -0,0 +1,102 @@
+import json
+import logging
+from asyncio import Task, create_task, sleep
+from typing import Callable
+from uuid import uuid4
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+InvalidationCallback = Callable[[str], None]
+
+
+class InvalidationBus:
+    """
+    Broadcasts cache invalidations to every process sharing a Redis, over pub/sub.
+    Invalidations are grouped into topics (i.e. "prefix"); each carries a key (i.e. a guild ID) saying what to drop.
+    A process never receives its own invalidations, since it has already updated its own caches.
+    Delivery is best-effort: pub/sub doesn't queue, so a process that is disconnected misses invalidations. Pair this with a TTL.
+    """
+
+    def __init__(
+        self, redis: Redis, *, channel: str = "peppercord:invalidation"
+    ) -> None:
+        self._redis = redis
+        self._channel = channel
+        self._origin = uuid4().hex
+        self._callbacks: dict[str, list[InvalidationCallback]] = {}
+        self._listener: Task[None] | None = None
+
+    def subscribe(self, topic: str, callback: InvalidationCallback) -> None:
+        """Calls callback with the key of every invalidation published to topic by other processes."""
+        self._callbacks.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic: str, callback: InvalidationCallback) -> None:
+        callbacks = self._callbacks.get(topic)
+        if callbacks is not None and callback in callbacks:
+            callbacks.remove(callback)
+
+    async def publish(self, topic: str, *keys: str) -> None:
+        """Tells every other process to drop keys from its caches for topic."""
+        if not keys:
+            return
+        try:
+            await self._redis.publish(
+                self._channel,
+                json.dumps({"origin": self._origin, "topic": topic, "keys": keys}),
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to publish invalidation for {topic}: {e}")
+
+    def _deliver(self, raw: bytes | str) -> None:
+        try:
+            invalidation = json.loads(raw)
+            origin, topic, keys = (
+                invalidation["origin"],
+                invalidation["topic"],
+                invalidation["keys"],
+            )
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed invalidation: {raw!r}")
+            return
+
+        if origin == self._origin:
+            return
+        for callback in list(self._callbacks.get(topic, [])):
+            for key in keys:
+                try:
+                    callback(key)
+                except Exception:
+                    logger.exception(f"Invalidation callback for {topic} failed!")
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    backoff = 1.0
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._deliver(message["data"])
+            except RedisError as e:
+                logger.warning(
+                    f"Lost the invalidation subscription, retrying in {backoff}s: {e}"
+                )
+                await sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def start(self) -> None:
+        """Starts listening for invalidations from other processes in the background."""
+        if self._listener is None or self._listener.done():
+            self._listener = create_task(self._listen(), name="invalidation_bus")
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+
+__all__ = ("InvalidationBus", "InvalidationCallback")
@@ -0,0 +1,148 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Any
+
+from discord import Message
+from discord.ext.commands import BucketType, Context, Cooldown
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Mirrors discord.ext.commands.Cooldown.update_rate_limit: a fixed window that starts when the first token is used.
+# Uses the Redis clock so that every process agrees on the time.
+# Returns retry_after as a string, since Redis would truncate a Lua number to an integer.
+_UPDATE_RATE_LIMIT = """
+local rate = tonumber(ARGV[1])
+local per = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'window')
+local tokens = tonumber(state[1]) or rate
+local window = tonumber(state[2]) or 0
+if tokens < 0 then
+    tokens = 0
+end
+if now > window + per then
+    tokens = rate
+end
+if tokens == rate then
+    window = now
+end
+tokens = tokens - cost
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'window', tostring(window))
+redis.call('PEXPIRE', KEYS[1], math.ceil(per * 1000))
+if tokens < 0 then
+    return tostring(per - (now - window))
+end
+return false
+"""
+
+
+class CooldownBackend(ABC):
+    """Somewhere to keep cooldown buckets."""
+
+    @abstractmethod
+    async def update_rate_limit(
+        self, key: str, rate: int, per: float, *, tokens: int = 1
+    ) -> float | None:
+        """Uses tokens from the bucket at key. Returns how long to wait if the bucket is empty, just like Cooldown.update_rate_limit."""
+        raise NotImplementedError
+
+
+class MemoryCooldownBackend(CooldownBackend):
+    """
+    Keeps cooldown buckets in this process. Only correct with a single process.
+    The least recently used buckets are forgotten once there are more than maxsize of them.
+    """
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self._buckets: LRUCache[str, Cooldown] = LRUCache(maxsize)
+
+    async def update_rate_limit(
+        self, key: str, rate: int, per: float, *, tokens: int = 1
+    ) -> float | None:
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.rate != rate or bucket.per != per:
+            bucket = Cooldown(rate, per)
+            self._buckets.put(key, bucket)
+        return bucket.update_rate_limit(tokens=tokens)
+
+
+class RedisCooldownBackend(CooldownBackend):
+    """
+    Keeps cooldown buckets in Redis, so that they are shared by every process, using one round trip per update.
+    Buckets expire on their own once their window has passed.
+    If Redis can't be reached, the fallback backend is used instead.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        fallback: CooldownBackend | None = None,
+        namespace: str = "peppercord:cooldown",
+    ) -> None:
+        self._redis = redis
+        self._script = redis.register_script(_UPDATE_RATE_LIMIT)
+        self._fallback = fallback if fallback is not None else MemoryCooldownBackend()
+        self._namespace = namespace
+
+    async def update_rate_limit(
+        self, key: str, rate: int, per: float, *, tokens: int = 1
+    ) -> float | None:
+        try:
+            retry_after = await self._script(
+                keys=[f"{self._namespace}:{key}"], args=[rate, per, tokens]
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to update cooldown in Redis, using fallback: {e}")
+            return await self._fallback.update_rate_limit(key, rate, per, tokens=tokens)
+        return float(retry_after) if retry_after is not None else None
+
+
+class CooldownMapping:
+    """
+    Like discord.ext.commands.CooldownMapping, but keeps its buckets in a CooldownBackend.
+    name distinguishes this mapping's buckets from those of other mappings in the same backend.
+    """
+
+    def __init__(
+        self,
+        backend: CooldownBackend,
+        name: str,
+        rate: int,
+        per: float,
+        type: BucketType,
+    ) -> None:
+        self.backend = backend
+        self.name = name
+        self.type = type
+        # Never updated; only used to describe this mapping, i.e. in CommandOnCooldown.
+        self.cooldown = Cooldown(rate, per)
+
+    def _bucket_key(self, origin: Message | Context[Any]) -> str:
+        return f"{self.name}:{self.type.name}:{self.type.get_key(origin)}"
+
+    async def update_rate_limit(
+        self, origin: Message | Context[Any], *, tokens: int = 1
+    ) -> float | None:
+        return await self.backend.update_rate_limit(
+            self._bucket_key(origin),
+            self.cooldown.rate,
+            self.cooldown.per,
+            tokens=tokens,
+        )
+
+
+__all__ = (
+    "CooldownBackend",
+    "CooldownMapping",
+    "MemoryCooldownBackend",
+    "RedisCooldownBackend",
+)
@@ -0,0 +1,189 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Mapping
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from utils.database import PCInternalDocument
+from utils.writebehind import IncrementBuffer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in milliseconds) of the latency histogram's buckets; anything slower lands in "inf".
+LATENCY_BUCKETS_MS: tuple[int, ...] = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+_LATENCY_BUCKET_NAMES: tuple[str, ...] = (
+    *(str(bound) for bound in LATENCY_BUCKETS_MS),
+    "inf",
+)
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    """Gets the start of the hour moment falls in."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def latency_bucket(latency_ms: float) -> str:
+    """Gets the name of the histogram bucket a latency falls in."""
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return str(bound)
+    return "inf"
+
+
+class CommandRollup:
+    """The usage of a single command, summed over a range of hours."""
+
+    def __init__(
+        self,
+        command: str,
+        cog: str | None,
+        *,
+        invocations: int = 0,
+        errors: int = 0,
+        latency_total_ms: float = 0.0,
+        histogram: Mapping[str, int] | None = None,
+    ) -> None:
+        self.command = command
+        self.cog = cog
+        self.invocations = invocations
+        self.errors = errors
+        self.latency_total_ms = latency_total_ms
+        self.histogram: dict[str, int] = dict(histogram or {})
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.invocations if self.invocations else 0.0
+
+    @property
+    def mean_latency_ms(self) -> float:
+        timed = sum(self.histogram.values())
+        return self.latency_total_ms / timed if timed else 0.0
+
+    def percentile_ms(self, percentile: float) -> float:
+        """
+        Estimates a latency percentile (from 0 to 1) from the histogram.
+        This is the upper bound of the bucket the percentile falls in, so it is never an underestimate (except for "inf").
+        """
+        timed = sum(self.histogram.values())
+        if not timed:
+            return 0.0
+        seen = 0
+        for name in _LATENCY_BUCKET_NAMES:
+            seen += self.histogram.get(name, 0)
+            if seen >= percentile * timed:
+                return float(name) if name != "inf" else float("inf")
+        return float("inf")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.command!r}, {self.cog!r}, invocations={self.invocations}, errors={self.errors})"
+
+
+class CommandRollups:
+    """
+    Keeps hourly usage rollups for commands: how often each was invoked, how often it failed, and a histogram of how long it took.
+    Each (command, cog, hour) has one document, which is only ever incremented through an IncrementBuffer, so recording is cheap.
+    Reads sum the hourly documents; they never touch individual invocations.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncCollection[PCInternalDocument],
+        buffer: IncrementBuffer,
+    ) -> None:
+        self.collection = collection
+        self.buffer = buffer
+
+    def record(
+        self,
+        command: str,
+        cog: str | None,
+        *,
+        failed: bool = False,
+        latency: float | None = None,
+        at: datetime | None = None,
+    ) -> None:
+        """
+        Records one invocation of a command. latency is in seconds, and is left out of the histogram if it isn't known.
+        at must be a naive UTC datetime, like the ones Mongo returns; it defaults to now.
+        """
+        hour = hour_bucket(at if at is not None else datetime.utcnow())  # type: ignore[deprecated]  # works fine
+        deltas: dict[str, int | float] = {"invocations": 1}
+        if failed:
+            deltas["errors"] = 1
+        if latency is not None:
+            latency_ms = latency * 1000
+            deltas[f"latency.{latency_bucket(latency_ms)}"] = 1
+            deltas["latency_total_ms"] = latency_ms
+        self.buffer.increment(
+            self.collection, {"command": command, "cog": cog, "hour": hour}, deltas
+        )
+
+    async def summarize(
+        self,
+        *,
+        since: datetime,
+        until: datetime | None = None,
+        command: str | None = None,
+    ) -> list[CommandRollup]:
+        """
+        Sums the rollups of every command (or just command) for the hours from since up to (but not including) until.
+        Invocations that haven't been flushed from the buffer yet aren't included.
+        """
+        hours: dict[str, datetime] = {"$gte": hour_bucket(since)}
+        if until is not None:
+            hours["$lt"] = until
+        match: dict[str, Any] = {"hour": hours}
+        if command is not None:
+            match["command"] = command
+
+        rollups: list[CommandRollup] = []
+        async for group in await self.collection.aggregate(
+            [
+                {"$match": match},
+                {
+                    "$group": {
+                        "_id": {"command": "$command", "cog": "$cog"},
+                        "invocations": {"$sum": "$invocations"},
+                        "errors": {"$sum": "$errors"},
+                        "latency_total_ms": {"$sum": "$latency_total_ms"},
+                        **{
+                            f"latency_{name}": {"$sum": f"$latency.{name}"}
+                            for name in _LATENCY_BUCKET_NAMES
+                        },
+                    }
+                },
+            ]
+        ):
+            rollups.append(
+                CommandRollup(
+                    group["_id"]["command"],
+                    group["_id"]["cog"],
+                    invocations=group["invocations"],
+                    errors=group["errors"],
+                    latency_total_ms=group["latency_total_ms"],
+                    histogram={
+                        name: group[f"latency_{name}"]
+                        for name in _LATENCY_BUCKET_NAMES
+                        if group[f"latency_{name}"]
+                    },
+                )
+            )
+        return rollups
+
+    async def summarize_recent(
+        self, hours: int = 1, *, command: str | None = None
+    ) -> list[CommandRollup]:
+        """Sums the rollups for the current hour and the hours - 1 before it."""
+        now = datetime.utcnow()  # type: ignore[deprecated]  # works fine
+        return await self.summarize(
+            since=hour_bucket(now) - timedelta(hours=hours - 1), command=command
+        )
+
+
+__all__ = (
+    "LATENCY_BUCKETS_MS",
+    "CommandRollup",
+    "CommandRollups",
+    "hour_bucket",
+    "latency_bucket",
+)
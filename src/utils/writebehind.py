@@ -0,0 +1,254 @@
+import logging
+from asyncio import Lock, Task, create_task, shield, sleep
+from typing import Any, Callable, Mapping, Sequence
+from weakref import ref
+
+from pymongo import UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError, PyMongoError, ServerSelectionTimeoutError
+
+from utils.cache import RedisDocumentCache, filter_key
+from utils.database import PCDocument, PCInternalDocument, versioned
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_deltas(
+    into: dict[str, int | float], deltas: Mapping[str, int | float]
+) -> None:
+    for field, delta in deltas.items():
+        into[field] = into.get(field, 0) + delta
+
+
+class _PendingIncrements:
+    def __init__(self, collection: AsyncCollection[PCInternalDocument], filter: Any):
+        self.collection = collection
+        self.filter = filter
+        self.deltas: dict[str, int | float] = {}
+        # Documents that already show these deltas locally, and how much of each delta is theirs.
+        # PCDocuments can't be hashed, and an id() can be reused once its document is collected, so they're matched by identity.
+        self.documents: list[tuple[ref[PCDocument], dict[str, int | float]]] = []
+
+    def add_document(
+        self, document: PCDocument, deltas: Mapping[str, int | float]
+    ) -> None:
+        for document_ref, document_deltas in self.documents:
+            if document_ref() is document:
+                _merge_deltas(document_deltas, deltas)
+                return
+        self.documents.append((ref(document), dict(deltas)))
+
+    def merge(self, other: _PendingIncrements) -> None:
+        _merge_deltas(self.deltas, other.deltas)
+        # Documents that have been collected don't need acknowledging anymore.
+        self.documents = [
+            (document_ref, deltas)
+            for document_ref, deltas in self.documents
+            if document_ref() is not None
+        ]
+        for document_ref, deltas in other.documents:
+            document = document_ref()
+            if document is not None:
+                self.add_document(document, deltas)
+
+    def acknowledge(self) -> list[PCDocument]:
+        """Marks the deltas as written on every document that is still alive, and returns those documents."""
+        acknowledged: list[PCDocument] = []
+        for document_ref, deltas in self.documents:
+            document = document_ref()
+            if document is not None:
+                document.acknowledge_increments(deltas)
+                acknowledged.append(document)
+        return acknowledged
+
+
+FlushCallback = Callable[
+    [AsyncCollection[PCInternalDocument], Any, Sequence[PCDocument]], None
+]
+
+
+class IncrementBuffer:
+    """
+    Accumulates $inc deltas in memory, per document and field, and writes them out as unordered bulk_writes.
+    Writes happen every interval seconds, or sooner if max_pending fields are waiting.
+    Counters written through this buffer are eventually consistent.
+
+    Once increments are written, copies of the documents in cache are dropped.
+    on_flushed is called with the collection, the filter, and the documents that already show the increments, for any other caches to catch up.
+    After close, increments are still accepted, but each one is written right away.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 5.0,
+        max_pending: int = 1000,
+        cache: RedisDocumentCache | None = None,
+        on_flushed: FlushCallback | None = None,
+    ) -> None:
+        self.interval = interval
+        self.max_pending = max_pending
+        self.cache = cache
+        self.on_flushed = on_flushed
+
+        # Keyed by (collection, filter)
+        self._pending: dict[tuple[str, str], _PendingIncrements] = {}
+        self._pending_fields = 0
+
+        self._flush_lock = Lock()
+        self._flusher: Task[None] | None = None
+        self._early_flush: Task[None] | None = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return self._pending_fields
+
+    def increment(
+        self,
+        collection: AsyncCollection[PCInternalDocument],
+        filter: Any,
+        deltas: Mapping[str, int | float],
+    ) -> None:
+        """Queues an $inc on the document matching filter. The document is upserted if it doesn't exist."""
+        incoming = _PendingIncrements(collection, filter)
+        _merge_deltas(incoming.deltas, deltas)
+        self._enqueue(incoming)
+
+    def increment_document(
+        self, document: PCDocument, deltas: Mapping[str, int | float]
+    ) -> None:
+        """Queues an $inc on a document, and applies it to the local copy right away so reads stay accurate."""
+        incoming = _PendingIncrements(document._collection, document._filter)
+        _merge_deltas(incoming.deltas, deltas)
+        incoming.add_document(document, deltas)
+        document.apply_increments_locally(deltas)
+        self._enqueue(incoming)
+
+    def _enqueue(self, incoming: _PendingIncrements) -> None:
+        key = (incoming.collection.full_name, filter_key(incoming.filter))
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _PendingIncrements(
+                incoming.collection, incoming.filter
+            )
+        fields_before = len(pending.deltas)
+        pending.merge(incoming)
+        self._pending_fields += len(pending.deltas) - fields_before
+
+        # Once closed, nothing flushes periodically anymore, so late increments (i.e. from commands finishing during shutdown) go out right away.
+        if (self._closed or self._pending_fields >= self.max_pending) and (
+            self._early_flush is None or self._early_flush.done()
+        ):
+            self._early_flush = create_task(self.flush())
+
+    def pending(
+        self, collection: AsyncCollection[PCInternalDocument], filter: Any, field: str
+    ) -> int | float:
+        """Gets the delta for a field that has not yet been written."""
+        pending = self._pending.get((collection.full_name, filter_key(filter)))
+        return pending.deltas.get(field, 0) if pending is not None else 0
+
+    async def flush(self) -> None:
+        """Writes out all pending increments. Anything that fails to write is kept for the next flush."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            flushing = self._pending
+            self._pending = {}
+            self._pending_fields = 0
+
+            by_collection: dict[str, list[_PendingIncrements]] = {}
+            for pending in flushing.values():
+                by_collection.setdefault(pending.collection.full_name, []).append(
+                    pending
+                )
+
+            for batch in by_collection.values():
+                collection = batch[0].collection
+                try:
+                    await collection.bulk_write(
+                        [
+                            UpdateOne(
+                                pending.filter,
+                                versioned({"$inc": pending.deltas}),
+                                upsert=True,
+                            )
+                            for pending in batch
+                        ],
+                        ordered=False,
+                    )
+                except BulkWriteError as e:
+                    # Only the operations with write errors didn't apply; the rest did, and mustn't be written twice.
+                    failed = [
+                        batch[error["index"]] for error in e.details["writeErrors"]
+                    ]
+                    logger.warning(
+                        f"{len(failed)} of {len(batch)} buffered increments to {collection.name} failed to write; retrying next flush."
+                    )
+                    self._requeue(failed)
+                    await self._written(
+                        [pending for pending in batch if pending not in failed]
+                    )
+                except ServerSelectionTimeoutError as e:
+                    # Never reached a server, so none of them applied.
+                    logger.warning(
+                        f"Failed to write {len(batch)} buffered increments to {collection.name}; retrying next flush: {e}"
+                    )
+                    self._requeue(batch)
+                except PyMongoError as e:
+                    # Some of them may have applied, and there's no telling which. Counting them twice would be worse than missing them.
+                    logger.error(
+                        f"Failed to write {len(batch)} buffered increments to {collection.name}, and dropped them since they may have partially applied: {e}"
+                    )
+                else:
+                    await self._written(batch)
+                    logger.debug(
+                        f"Flushed {len(batch)} buffered increments to {collection.name}."
+                    )
+
+    async def _written(self, batch: list[_PendingIncrements]) -> None:
+        for pending in batch:
+            acknowledged = pending.acknowledge()
+            if self.on_flushed is not None:
+                try:
+                    self.on_flushed(pending.collection, pending.filter, acknowledged)
+                except Exception:
+                    logger.exception("Failed to refresh caches after a flush!")
+
+        if self.cache is not None and batch:
+            # Local copies only show this process's increments, not what others wrote since they were loaded, so they can't replace the cached copies.
+            # Every pending increment in a batch is for the same collection.
+            await self.cache.invalidate_many(
+                batch[0].collection, [pending.filter for pending in batch]
+            )
+
+    def _requeue(self, failed: list[_PendingIncrements]) -> None:
+        for pending in failed:
+            self._enqueue(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.interval)
+            try:
+                # Shielded so that close() can't interrupt a write halfway; its own flush waits for this one to finish.
+                await shield(self.flush())
+            except Exception:
+                logger.exception("Failed to flush buffered increments!")
+
+    def start(self) -> None:
+        """Starts flushing periodically in the background."""
+        self._closed = False
+        if self._flusher is None or self._flusher.done():
+            self._flusher = create_task(self._run(), name="increment_buffer")
+
+    async def close(self) -> None:
+        """Stops the background flusher, then flushes whatever is left (after any flush that is already running)."""
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+
+__all__ = ("FlushCallback", "IncrementBuffer")